@@ -1,21 +1,90 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, get_flashed_messages
+from flask import Flask, render_template, request, redirect, url_for, session, flash, get_flashed_messages, g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, func, distinct, text, case, or_
+from sqlalchemy.engine import Engine
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm.attributes import set_committed_value
 from werkzeug.security import generate_password_hash, check_password_hash
 from random import shuffle
-from difflib import SequenceMatcher
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import IntegrityError, OperationalError
+from bisect import bisect_left, insort
+from collections import OrderedDict, namedtuple
+from itertools import groupby
+from urllib.parse import quote
 import random
 import datetime
-from flask import send_file
+import threading
+import time
+import unicodedata
+import zlib
+from flask import Response, stream_with_context, abort, before_render_template, template_rendered
 import io
 import csv
 import json
+import atexit
+import codecs
+import click
 import os
+import re
+import sqlite3
+from study_sessions import create_study_store, new_session_id
+from grading import grade_answer, grade_many
+from metrics import Metrics, SamplingProfiler, QUERY_COUNT_BUCKETS
+
+def engine_options(database_url):
+    # Pool sizes can be tuned per deployment; each gunicorn thread may hold one connection.
+    if database_url.startswith('sqlite'):
+        if database_url in ('sqlite://', 'sqlite:///:memory:'):
+            return {}
+        return {
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+            'pool_timeout': 30
+        }
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True
+    }
+
+DEV_SECRET_KEY = 'your-secret-key'  # only for the debug server; create_app() refuses to run with it
 
 app = Flask(__name__)
-app.config['SECRET_KEY'] = 'your-secret-key'
+app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', DEV_SECRET_KEY)
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///flashcards.db')
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 app.config['APPLICATION_NAME'] = 'Study Ace'
+app.config['RANKING_TTL'] = 60  # seconds before the in-process ranking is reloaded from the database
+app.config['STATS_CACHE_TTL'] = 300  # seconds cached answer counts are trusted; set/card counts follow User.stats_version
+app.config['STATS_CACHE_SIZE'] = 10000  # users whose dashboard stats are kept in memory
+app.config['MAX_CONTENT_LENGTH'] = 32 * 1024 * 1024  # upload size cap, larger requests get a 413
+app.config['IMPORT_MAX_CARDS'] = 200000
+app.config['IMPORT_BATCH_SIZE'] = 1000
+app.config['EXPORT_CHUNK_SIZE'] = 64 * 1024
+app.config['EXPORT_GZIP'] = True  # gzip exports for clients that accept it
+app.config['SEARCH_PAGE_SIZE'] = 20
+app.config['STUDY_SESSION_STORE'] = os.environ.get('STUDY_SESSION_STORE', 'sqlite')  # 'sqlite', 'memory' or 'redis'
+app.config['STUDY_SESSION_TTL'] = 2 * 60 * 60  # idle seconds before a study session expires
+app.config['STUDY_SESSION_REDIS_URL'] = os.environ.get('STUDY_SESSION_REDIS_URL', 'redis://localhost:6379/0')
+app.config['STUDY_SESSION_PATH'] = os.environ.get('STUDY_SESSION_PATH')  # sqlite store file, defaults to the instance folder
+app.config['CARD_SNAPSHOT_CACHE_SIZE'] = 256  # study sessions whose cards are kept in memory
+app.config['QUERY_COUNT_HEADER'] = False  # send X-Query-Count on every response (always on in debug)
+app.config['METRICS_ENABLED'] = True  # serve /metrics
+app.config['PROFILER_ENABLED'] = os.environ.get('PROFILER_ENABLED') == '1'  # /profiler/start and /profiler/stop, always on in debug
+app.config['PROFILER_INTERVAL'] = 0.005  # seconds between stack samples
+app.config['QUERY_BUDGET'] = 20  # queries per request before debug mode warns and testing mode fails
+app.config['QUERY_BUDGETS'] = {
+    # Endpoints whose query count grows with the upload, in batches. None disables the check.
+    'import_set': None,
+    'bulk_grade_answers': None
+}
+app.config['BULK_GRADE_MAX_ROWS'] = 200000
+app.config['BULK_GRADE_WORKERS'] = None  # grading processes, None uses every CPU
+app.config['DUE_SESSION_SIZE'] = 20  # cards per spaced-repetition session, due reviews first then new cards
+app.config['REVIEW_LOG_BATCH_SIZE'] = 100  # buffered answers written per insert
+app.config['REVIEW_LOG_FLUSH_INTERVAL'] = 5  # seconds an answer may wait in the buffer before the next one flushes it
 db = SQLAlchemy(app)
 
 class User(db.Model):
@@ -25,24 +94,124 @@ class User(db.Model):
     flashcard_sets = db.relationship('FlashcardSet', backref='user', lazy=True)
     streak = db.Column(db.Integer, default=0)
     last_active = db.Column(db.String(20), default=None)
-    points = db.Column(db.Integer, default=0)
+    points = db.Column(db.Integer, default=0, index=True)
     badges = db.Column(db.String(255), default="")
     daily_challenge_date = db.Column(db.String(20), default=None)
     daily_challenge_progress = db.Column(db.Integer, default=0)
     daily_challenge_completed = db.Column(db.Boolean, default=False)
+    stats_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # bumped by set/card writes
 
 class FlashcardSet(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     cards = db.relationship('Flashcard', backref='flashcard_set', lazy=True)
 
+card_tags = db.Table(
+    'card_tag',
+    db.Column('card_id', db.Integer, db.ForeignKey('flashcard.id'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True),
+    db.Index('ix_card_tag_tag_id_card_id', 'tag_id', 'card_id')
+)
+
 class Flashcard(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     term = db.Column(db.String(200), nullable=False)
     definition = db.Column(db.String(500), nullable=False)
     set_id = db.Column(db.Integer, db.ForeignKey('flashcard_set.id'), nullable=False)
-    tags = db.Column(db.String(200), default="")  # comma-separated tags
+    tags = db.Column(db.String(200), default="")  # display copy of tag_list, written by set_card_tags callers
+    tag_list = db.relationship('Tag', secondary=card_tags, lazy=True)
+    __table_args__ = (db.Index('ix_flashcard_set_id_id', 'set_id', 'id'),)
+
+class Tag(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+
+class CardReview(db.Model):
+    # SM-2 state for one user and card. set_id is copied from the card so the due queue
+    # of a set is a range scan of ix_card_review_due.
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    card_id = db.Column(db.Integer, db.ForeignKey('flashcard.id'), primary_key=True)
+    set_id = db.Column(db.Integer, db.ForeignKey('flashcard_set.id'), nullable=False)
+    ease = db.Column(db.Float, nullable=False, default=2.5)
+    interval = db.Column(db.Integer, nullable=False, default=0)  # days
+    repetitions = db.Column(db.Integer, nullable=False, default=0)
+    due = db.Column(db.Date, nullable=False)
+    __table_args__ = (db.Index('ix_card_review_due', 'user_id', 'set_id', 'due'),)
+
+class ReviewEvent(db.Model):
+    # Append-only log of graded answers. No foreign keys: events outlive the cards they mention.
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    card_id = db.Column(db.Integer, nullable=False)
+    mode = db.Column(db.String(20), nullable=False)
+    verdict = db.Column(db.String(10), nullable=False)
+    # SequenceMatcher ratio, 0 to 1, of the lowercased answers; NULL when a quick upper bound rejected the answer
+    similarity = db.Column(db.Float)
+    latency_ms = db.Column(db.Integer)  # time from showing the card to the answer, if known
+    created_at = db.Column(db.DateTime, nullable=False)
+    __table_args__ = (db.Index('ix_review_event_user_id_created_at', 'user_id', 'created_at'),)
+
+class SchemaMigration(db.Model):
+    revision = db.Column(db.String(64), primary_key=True)
+    applied_at = db.Column(db.DateTime, nullable=False)
+
+class UserBadge(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    name = db.Column(db.String(100), primary_key=True)
+
+class Ranking:
+    # Users ordered by (-points, id), the same order the leaderboard shows.
+    # Loaded once with an indexed query, then kept up to date by the point functions.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []
+        self._points = {}
+        self._loaded_at = None
+
+    def _ensure_loaded(self):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < app.config['RANKING_TTL']:
+            return
+        rows = db.session.query(User.id, User.points).order_by(User.points.desc(), User.id).all()
+        self._keys = [(-(points or 0), user_id) for user_id, points in rows]
+        self._points = {user_id: points or 0 for user_id, points in rows}
+        self._loaded_at = time.monotonic()
+
+    def update(self, user_id, points):
+        points = points or 0
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            old = self._points.get(user_id)
+            if old == points:
+                return
+            if old is not None:
+                del self._keys[bisect_left(self._keys, (-old, user_id))]
+            insort(self._keys, (-points, user_id))
+            self._points[user_id] = points
+
+    def remove(self, user_id):
+        with self._lock:
+            old = self._points.pop(user_id, None)
+            if old is not None:
+                del self._keys[bisect_left(self._keys, (-old, user_id))]
+
+    def rank(self, user_id):
+        with self._lock:
+            self._ensure_loaded()
+            points = self._points.get(user_id)
+            if points is None:
+                return None
+            return bisect_left(self._keys, (-points, user_id)) + 1
+
+    def top(self, n=10):
+        with self._lock:
+            self._ensure_loaded()
+            ids = [user_id for _, user_id in self._keys[:n]]
+        users = {u.id: u for u in User.query.filter(User.id.in_(ids)).all()} if ids else {}
+        return [users[user_id] for user_id in ids if user_id in users]
+
+ranking = Ranking()
 
 @app.route('/')
 def index():
@@ -62,6 +231,7 @@ def signup():
         new_user = User(username=username, password=hashed_password)
         db.session.add(new_user)
         db.session.commit()
+        ranking.update(new_user.id, new_user.points)
         session['theme'] = 'blue'
         default_set = FlashcardSet.query.filter_by(title="Python (default)", user_id=new_user.id).first()
         if not default_set:
@@ -130,34 +300,26 @@ def calculate_user_level(user):
 
 @app.route('/leaderboard')
 def leaderboard():
-    users = User.query.all()
-    leaderboard_data = []
-    for user in users:
-        level = calculate_user_level(user)
-        leaderboard_data.append({
+    def leaderboard_entry(user):
+        return {
             "id": user.id,
             "username": user.username,
             "points": user.points,
-            "level": level
-        })
-    leaderboard_data.sort(key=lambda x: x["points"], reverse=True)
-    top_users = leaderboard_data[:10]
-    user_ranks = {user["id"]: idx + 1 for idx, user in enumerate(leaderboard_data)}
+            "level": calculate_user_level(user)
+        }
+    top_users = [leaderboard_entry(user) for user in ranking.top(10)]
     my_rank = None
     my_user = None
     if 'user_id' in session:
-        my_rank = user_ranks.get(session["user_id"])
-        my_user = next((u for u in leaderboard_data if u["id"] == session["user_id"]), None)
-    else:
-        my_rank = None
-        my_user = None
+        my_rank = ranking.rank(session["user_id"])
+        user = User.query.get(session["user_id"])
+        if user:
+            my_user = leaderboard_entry(user)
     return render_template(
         'leaderboard.html',
         top_users=top_users,
         my_rank=my_rank,
-        my_user=my_user,
-        all_users=leaderboard_data,
-        user_ranks=user_ranks
+        my_user=my_user
     )
 
 @app.route('/dashboard', methods=['GET', 'POST'])
@@ -175,14 +337,15 @@ def dashboard():
     if request.method == 'POST':
         search_query = request.form.get('search_query', '').strip().lower()
         if search_query:
-            matching = [s for s in flashcard_sets if search_query in s.title.lower()]
-            non_matching = [s for s in flashcard_sets if search_query not in s.title.lower()]
-            flashcard_sets = matching + non_matching
+            matching, _ = search_sets_for_user(user.id, search_query, per_page=max(len(flashcard_sets), 1))
+            matching_ids = {s.id for s in matching}
+            flashcard_sets = matching + [s for s in flashcard_sets if s.id not in matching_ids]
             flash(f"Showing results for '{search_query}'", 'info')
-    streak = getattr(user, 'streak', 0)
-    points = getattr(user, 'points', 0)
-    update_achievements(user)
-    achievements = [b for b in (user.badges or "").split(",") if b]
+    stats = get_user_stats(user)
+    streak = stats['streak']
+    points = stats['points']
+    accuracy = round(100 * stats['correct_answers'] / stats['answers']) if stats['answers'] else None
+    achievements = list(stats['achievements'])
     user_rank = calculate_user_level(user)
     daily_challenge = get_daily_challenge()
     latest_achievement = None
@@ -204,6 +367,8 @@ def dashboard():
         search_query=search_query,
         streak=streak,
         points=points,
+        answers=stats['answers'],
+        accuracy=accuracy,
         achievements=achievements,
         latest_achievement=latest_achievement,
         user_rank=user_rank,
@@ -232,10 +397,12 @@ def create_set():
             )
         new_set = FlashcardSet(title=title, user_id=session['user_id'])
         db.session.add(new_set)
-        db.session.commit()
-        for term, definition in valid_cards:
-            card = Flashcard(term=term, definition=definition, set_id=new_set.id)
-            db.session.add(card)
+        db.session.flush()
+        db.session.bulk_insert_mappings(Flashcard, [
+            {'term': term, 'definition': definition, 'set_id': new_set.id, 'tags': ''}
+            for term, definition in valid_cards
+        ])
+        update_achievements(User.query.get(session['user_id']))
         db.session.commit()
         flash('Flashcard set created successfully')
         return redirect(url_for('dashboard'))
@@ -259,13 +426,22 @@ def delete_set(set_id):
     if flashcard_set.user_id != session['user_id']:
         flash('Access denied')
         return redirect(url_for('dashboard'))
-    for card in flashcard_set.cards:
-        db.session.delete(card)
-    db.session.delete(flashcard_set)
+    delete_sets([set_id])
+    update_achievements(User.query.get(session['user_id']))
     db.session.commit()
     flash('Flashcard set deleted successfully')
     return redirect(url_for('dashboard'))
 
+def delete_sets(set_ids):
+    # Bulk DELETE ... WHERE set_id IN (...) for the sets and everything hanging off them, children first.
+    if not set_ids:
+        return
+    card_ids = db.select(Flashcard.id).where(Flashcard.set_id.in_(set_ids))
+    db.session.execute(card_tags.delete().where(card_tags.c.card_id.in_(card_ids)))
+    db.session.execute(db.delete(CardReview).where(CardReview.set_id.in_(set_ids)))
+    db.session.execute(db.delete(Flashcard).where(Flashcard.set_id.in_(set_ids)))
+    db.session.execute(db.delete(FlashcardSet).where(FlashcardSet.id.in_(set_ids)))
+
 @app.route('/edit_set/<int:set_id>', methods=['GET', 'POST'])
 def edit_set(set_id):
     if 'user_id' not in session:
@@ -275,22 +451,369 @@ def edit_set(set_id):
         flash('Access denied')
         return redirect(url_for('dashboard'))
     if request.method == 'POST':
-        flashcard_set.title = request.form['title']
-        for card in flashcard_set.cards:
-            db.session.delete(card)
-        db.session.commit()
+        delete_card_id = request.form.get('delete_card_id', '')
+        if delete_card_id.isdigit():
+            card = Flashcard.query.filter_by(id=int(delete_card_id), set_id=set_id).first()
+            if card:
+                db.session.execute(db.delete(CardReview).where(CardReview.card_id == card.id))
+                db.session.delete(card)
+                update_achievements(User.query.get(session['user_id']))
+            db.session.commit()
+            flash('Card deleted.' if card else 'Card not found.')
+            return redirect(url_for('edit_set', set_id=set_id))
+        if flashcard_set.title != request.form['title']:
+            flashcard_set.title = request.form['title']
         terms = request.form.getlist('term')
         definitions = request.form.getlist('definition')
         tags_list = request.form.getlist('tags')
-        for term, definition, tags in zip(terms, definitions, tags_list):
-            if term and definition:
-                card = Flashcard(term=term, definition=definition, set_id=flashcard_set.id, tags=tags)
-                db.session.add(card)
+        card_ids = request.form.getlist('card_id')
+        card_ids += [''] * (len(terms) - len(card_ids))
+        rows = [
+            (card_id, term, definition, tags)
+            for card_id, term, definition, tags in zip(card_ids, terms, definitions, tags_list)
+            if term and definition
+        ]
+        added, updated, removed = apply_card_diff(flashcard_set.id, rows)
+        if added or removed:
+            update_achievements(User.query.get(session['user_id']))
         db.session.commit()
-        flash('Flashcard set updated successfully')
+        flash(f'Flashcard set updated successfully ({added} added, {updated} updated, {removed} removed).')
         return redirect(url_for('dashboard'))
     return render_template('edit_set.html', flashcard_set=flashcard_set)
 
+def apply_card_diff(set_id, rows):
+    # rows are (card_id, term, definition, tags) as submitted; card_id is '' for new cards.
+    existing = {
+        card_id: (term, definition, tags or '')
+        for card_id, term, definition, tags in db.session.query(
+            Flashcard.id, Flashcard.term, Flashcard.definition, Flashcard.tags
+        ).filter_by(set_id=set_id)
+    }
+    inserts = []
+    updates = []
+    tags_by_card = {}
+    kept = set()
+    for card_id, term, definition, tags in rows:
+        card_id = int(card_id) if card_id.isdigit() else None
+        values = {'term': term, 'definition': definition, 'tags': ', '.join(parse_tags(tags))}
+        if card_id in existing and card_id not in kept:
+            kept.add(card_id)
+            if existing[card_id] != (term, definition, values['tags']):
+                updates.append({'id': card_id, **values})
+                if existing[card_id][2] != values['tags']:
+                    tags_by_card[card_id] = values['tags']
+        else:
+            inserts.append({'set_id': set_id, **values})
+    deletes = [card_id for card_id in existing if card_id not in kept]
+    if deletes:
+        db.session.execute(card_tags.delete().where(card_tags.c.card_id.in_(deletes)))
+        db.session.execute(db.delete(CardReview).where(CardReview.card_id.in_(deletes)))
+        db.session.execute(db.delete(Flashcard).where(Flashcard.id.in_(deletes)))
+    if updates:
+        db.session.bulk_update_mappings(Flashcard, updates)
+    untagged = [values for values in inserts if not values['tags']]
+    if untagged:
+        db.session.bulk_insert_mappings(Flashcard, untagged)
+    # Tagged cards need their new ids for card_tag rows; RETURNING pairs each id with its tags in one batch.
+    tagged = [values for values in inserts if values['tags']]
+    if tagged:
+        tags_by_card.update(db.session.execute(db.insert(Flashcard).returning(Flashcard.id, Flashcard.tags), tagged).all())
+    if tags_by_card:
+        set_card_tags(tags_by_card)
+    return len(inserts), len(updates), len(deletes)
+
+def parse_tags(tags):
+    names = []
+    for name in (tags or '').split(','):
+        name = name.strip()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+def set_card_tags(tags_by_card):
+    # Replace the card_tag rows of the given cards with their comma-separated tags.
+    names_by_card = {card_id: parse_tags(tags) for card_id, tags in tags_by_card.items()}
+    all_names = {name for names in names_by_card.values() for name in names}
+    tag_ids = dict(db.session.query(Tag.name, Tag.id).filter(Tag.name.in_(all_names))) if all_names else {}
+    missing = all_names - tag_ids.keys()
+    if missing:
+        db.session.bulk_insert_mappings(Tag, [{'name': name} for name in missing])
+        tag_ids.update(db.session.query(Tag.name, Tag.id).filter(Tag.name.in_(missing)))
+    db.session.execute(card_tags.delete().where(card_tags.c.card_id.in_(list(names_by_card))))
+    links = [{'card_id': card_id, 'tag_id': tag_ids[name]} for card_id, names in names_by_card.items() for name in names]
+    if links:
+        db.session.execute(card_tags.insert(), links)
+
+def migrate_card_tags(batch_size=1000):
+    # Backfill card_tag from the comma-separated Flashcard.tags column for cards without tag rows (migration 0006).
+    # Commits per batch, so an interrupted run resumes where it stopped.
+    last_id = 0
+    migrated = 0
+    while True:
+        rows = db.session.query(Flashcard.id, Flashcard.tags).filter(
+            Flashcard.id > last_id,
+            Flashcard.tags != '',
+            ~db.exists().where(card_tags.c.card_id == Flashcard.id)
+        ).order_by(Flashcard.id).limit(batch_size).all()
+        if not rows:
+            break
+        set_card_tags(dict(rows))
+        db.session.commit()
+        last_id = rows[-1][0]
+        migrated += len(rows)
+    return migrated
+
+@app.cli.command('migrate-tags')
+def migrate_tags_command():
+    db.create_all()
+    print(f'Migrated tags for {migrate_card_tags()} cards.')
+
+study_store = None
+
+def get_study_store():
+    global study_store
+    if study_store is None:
+        path = app.config['STUDY_SESSION_PATH']
+        if not path:
+            os.makedirs(app.instance_path, exist_ok=True)
+            path = os.path.join(app.instance_path, 'study_sessions.db')
+        study_store = create_study_store(
+            app.config['STUDY_SESSION_STORE'],
+            app.config['STUDY_SESSION_TTL'],
+            path=path,
+            redis_url=app.config['STUDY_SESSION_REDIS_URL']
+        )
+    return study_store
+
+def study_state():
+    # Card orders and progress for the practise modes, kept server-side under a short id in the cookie.
+    if 'study_state' not in g:
+        sid = session.get('study_sid')
+        if sid:
+            state = get_study_store().get(sid)
+        else:
+            state = None
+            session['study_sid'] = new_session_id()
+        g.study_state = state or {}
+        g.study_state_saved = json.dumps(g.study_state, sort_keys=True)
+    return g.study_state
+
+@app.after_request
+def save_study_state(response):
+    if 'study_state' in g and json.dumps(g.study_state, sort_keys=True) != g.study_state_saved:
+        get_study_store().set(session['study_sid'], g.study_state)
+    return response
+
+class LRUCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+StudyCard = namedtuple('StudyCard', 'id term definition')
+
+# Cards of each running study session, loaded once when the session starts. Steps
+# that miss the cache (evicted, or served by another process) fetch one card by id.
+card_snapshots = LRUCache(app.config['CARD_SNAPSHOT_CACHE_SIZE'])
+
+def start_study_session(study, prefix, set_id, keep=None, min_cards=1, card_ids=None):
+    # card_ids fixes the order of the session; otherwise every card in the set is shuffled.
+    query = db.session.query(Flashcard.id, Flashcard.term, Flashcard.definition).filter_by(set_id=set_id)
+    if card_ids is not None:
+        query = query.filter(Flashcard.id.in_(card_ids))
+    rows = query.order_by(Flashcard.id).all()
+    if len(rows) < min_cards:
+        return None
+    snapshot = {row.id: StudyCard(*row) for row in rows if keep is None or keep(row)}
+    study.pop(f'{prefix}_shown', None)
+    if card_ids is None:
+        card_order = list(snapshot)
+        shuffle(card_order)
+    else:
+        card_order = [card_id for card_id in card_ids if card_id in snapshot]
+    card_snapshots.put((session['study_sid'], prefix), snapshot)
+    study[f'{prefix}_order'] = card_order
+    study[f'{prefix}_index'] = 0
+    study[f'{prefix}_score'] = 0
+    study[f'{prefix}_set_id'] = set_id
+    return card_order
+
+def study_card(prefix, card_id):
+    snapshot = card_snapshots.get((session['study_sid'], prefix))
+    if snapshot is not None and card_id in snapshot:
+        return snapshot[card_id]
+    row = db.session.query(Flashcard.id, Flashcard.term, Flashcard.definition).filter_by(id=card_id).first()
+    return StudyCard(*row) if row else None
+
+def study_distractors(prefix, card_order, card, count=3):
+    # Wrong options for multiple choice, drawn from a small random sample of the session's cards.
+    candidate_ids = random.sample(card_order, min(len(card_order), count * 4 + 1))
+    snapshot = card_snapshots.get((session['study_sid'], prefix)) or {}
+    missing = [card_id for card_id in candidate_ids if card_id not in snapshot and card_id != card.id]
+    fetched = dict(db.session.query(Flashcard.id, Flashcard.definition).filter(Flashcard.id.in_(missing))) if missing else {}
+    options = []
+    for card_id in candidate_ids:
+        if card_id == card.id:
+            continue
+        definition = snapshot[card_id].definition if card_id in snapshot else fetched.get(card_id)
+        if definition is not None and definition != card.definition and definition not in options:
+            options.append(definition)
+            if len(options) == count:
+                break
+    return options
+
+REVIEW_QUALITY = {'correct': 5, 'almost': 3, 'incorrect': 1}  # SM-2 answer quality per verdict
+
+def schedule_review(review, quality, today):
+    if quality < 3:
+        review.repetitions = 0
+        review.interval = 1
+    else:
+        if review.repetitions == 0:
+            review.interval = 1
+        elif review.repetitions == 1:
+            review.interval = 6
+        else:
+            review.interval = round(review.interval * review.ease)
+        review.repetitions += 1
+    review.ease = max(1.3, review.ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    review.due = today + datetime.timedelta(days=review.interval)
+
+def record_review(user_id, set_id, card_id, verdict):
+    review = db.session.get(CardReview, (user_id, card_id))
+    if review is None:
+        review = CardReview(user_id=user_id, card_id=card_id, set_id=set_id, ease=2.5, interval=0, repetitions=0)
+        db.session.add(review)
+    schedule_review(review, REVIEW_QUALITY[verdict], datetime.date.today())
+
+def due_card_ids(user_id, set_id, limit):
+    # Reviews that are due, most overdue first, topped up with cards the user has never reviewed.
+    card_ids = [card_id for card_id, in db.session.query(CardReview.card_id).filter(
+        CardReview.user_id == user_id,
+        CardReview.set_id == set_id,
+        CardReview.due <= datetime.date.today()
+    ).order_by(CardReview.due).limit(limit)]
+    if len(card_ids) < limit:
+        reviewed = db.exists().where(CardReview.user_id == user_id, CardReview.card_id == Flashcard.id)
+        card_ids += [card_id for card_id, in db.session.query(Flashcard.id).filter(
+            Flashcard.set_id == set_id,
+            ~reviewed
+        ).order_by(Flashcard.id).limit(limit - len(card_ids))]
+    return card_ids
+
+class ReviewEventWriter:
+    # Buffers ReviewEvent rows and inserts them in batches on a connection of its own, so logging
+    # an answer adds no commit to the request. Rows are flushed when the batch is full, by a background
+    # thread once the oldest is flush_interval old, and at exit. Readers add pending().
+    def __init__(self, batch_size, flush_interval):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._rows = []
+        self._oldest = None
+        self._engine = None
+        self._lock = threading.Lock()
+        self._timer_pid = None
+
+    def add(self, row):
+        with self._lock:
+            if self._engine is None:
+                self._engine = db.engine
+            if self._timer_pid != os.getpid():
+                # Started on first use in each process: threads do not survive a gunicorn fork.
+                self._timer_pid = os.getpid()
+                threading.Thread(target=self._flush_periodically, name='review-log-flush', daemon=True).start()
+            self._rows.append(row)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = len(self._rows) >= self.batch_size or time.monotonic() - self._oldest >= self.flush_interval
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            rows, self._rows = self._rows, []
+            self._oldest = None
+            engine = self._engine
+        if not rows:
+            return 0
+        try:
+            with engine.begin() as conn:
+                conn.execute(ReviewEvent.__table__.insert(), rows)
+        except Exception:
+            with self._lock:
+                self._rows[:0] = rows
+                self._oldest = self._oldest or time.monotonic()
+            app.logger.exception('Could not write %d review events, keeping them for the next flush', len(rows))
+            return 0
+        return len(rows)
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.flush_interval / 2)
+            with self._lock:
+                due = self._oldest is not None and time.monotonic() - self._oldest >= self.flush_interval
+            if due:
+                self.flush()
+
+    def pending(self, user_id):
+        with self._lock:
+            return [row for row in self._rows if row['user_id'] == user_id]
+
+review_log = ReviewEventWriter(app.config['REVIEW_LOG_BATCH_SIZE'], app.config['REVIEW_LOG_FLUSH_INTERVAL'])
+atexit.register(review_log.flush)
+
+def mark_card_shown(study, prefix, idx):
+    shown = study.get(f'{prefix}_shown')
+    if not shown or shown[0] != idx:
+        study[f'{prefix}_shown'] = [idx, time.time()]
+
+def answer_latency_ms(study, prefix, idx):
+    shown = study.get(f'{prefix}_shown')
+    if shown and shown[0] == idx:
+        return int((time.time() - shown[1]) * 1000)
+    return None
+
+def log_answer(mode, card_id, verdict, similarity, latency_ms):
+    review_log.add({
+        'user_id': session['user_id'],
+        'card_id': card_id,
+        'mode': mode,
+        'verdict': verdict,
+        'similarity': similarity,
+        'latency_ms': latency_ms,
+        'created_at': datetime.datetime.utcnow()
+    })
+    stats = user_stats_cache.get(session['user_id'])
+    if stats is not None:
+        stats['answers'] += 1
+        stats['correct_answers'] += verdict == 'correct'
+
+def answer_counts(user_id):
+    counts = dict(db.session.query(ReviewEvent.verdict, func.count()).filter(
+        ReviewEvent.user_id == user_id
+    ).group_by(ReviewEvent.verdict))
+    for row in review_log.pending(user_id):
+        counts[row['verdict']] = counts.get(row['verdict'], 0) + 1
+    return sum(counts.values()), counts.get('correct', 0)
+
 @app.route('/game/<int:set_id>', methods=['GET', 'POST'])
 def flashcard_game(set_id):
     if 'user_id' not in session:
@@ -299,45 +822,44 @@ def flashcard_game(set_id):
     if flashcard_set.user_id != session['user_id']:
         flash('Access denied')
         return redirect(url_for('dashboard'))
-    cards = flashcard_set.cards[:]
-    if not cards:
-        flash('No cards in this set.')
-        return redirect(url_for('dashboard'))
-    if 'game_order' not in session or session.get('game_set_id') != set_id:
-        card_order = list(range(len(cards)))
-        shuffle(card_order)
-        session['game_order'] = card_order
-        session['game_index'] = 0
-        session['game_score'] = 0
-        session['game_set_id'] = set_id
-    else:
-        card_order = session['game_order']
-    idx = session['game_index']
-    score = session['game_score']
+    study = study_state()
+    if 'game_order' not in study or study.get('game_set_id') != set_id:
+        if start_study_session(study, 'game', set_id) is None:
+            flash('No cards in this set.')
+            return redirect(url_for('dashboard'))
+    card_order = study['game_order']
+    idx = study['game_index']
+    score = study['game_score']
     if idx >= len(card_order):
         final_score = score
-        session.pop('game_index', None)
-        session.pop('game_score', None)
-        session.pop('game_set_id', None)
-        session.pop('game_order', None)
+        study.pop('game_index', None)
+        study.pop('game_score', None)
+        study.pop('game_set_id', None)
+        study.pop('game_order', None)
         return render_template('game_result.html', score=final_score, total=len(card_order), flashcard_set=flashcard_set)
-    current_card = cards[card_order[idx]]
+    current_card = study_card('game', card_order[idx])
+    if current_card is None:
+        study['game_index'] = idx + 1  # deleted since the game started
+        return redirect(url_for('flashcard_game', set_id=set_id))
     if request.method == 'POST':
         user_answer = request.form.get('user_answer', '').strip()
         correct_answer = current_card.definition
-        similarity = SequenceMatcher(None, user_answer.lower(), correct_answer.lower()).ratio()
-        if similarity > 0.7:
+        grade = grade_answer(user_answer, correct_answer)
+        verdict = grade.verdict
+        if verdict == 'correct':
             score += 1
             flash('Correct!')
             update_daily_challenge(1)
-        elif similarity > 0.4:
+        elif verdict == 'almost':
             flash(f'Almost correct! The correct answer was: {correct_answer}')
         else:
             flash(f'Incorrect. The correct answer was: {correct_answer}')
+        log_answer('game', current_card.id, verdict, grade.similarity, answer_latency_ms(study, 'game', idx))
         idx += 1
-        session['game_index'] = idx
-        session['game_score'] = score
+        study['game_index'] = idx
+        study['game_score'] = score
         return redirect(url_for('flashcard_game', set_id=set_id))
+    mark_card_shown(study, 'game', idx)
     return render_template(
         'game.html',
         term=current_card.term,
@@ -363,49 +885,99 @@ def flashcard_practise(set_id):
             set_id=set_id,
             flashcard_set=flashcard_set
         )
-    cards = flashcard_set.cards[:]
-    if not cards:
-        flash('No cards in this set.')
-        return redirect(url_for('dashboard'))
+    study = study_state()
     if mode == 'classic':
-        if 'practise_order' not in session or session.get('practise_set_id') != set_id or len(session.get('practise_order', [])) != len(cards):
-            card_order = list(range(len(cards)))
-            shuffle(card_order)
-            session['practise_order'] = card_order
-            session['practise_index'] = 0
-            session['practise_score'] = 0
-            session['practise_set_id'] = set_id
-        else:
-            card_order = session['practise_order']
-        idx = session['practise_index']
-        score = session['practise_score']
+        if 'practise_order' not in study or study.get('practise_set_id') != set_id:
+            if start_study_session(study, 'practise', set_id) is None:
+                flash('No cards in this set.')
+                return redirect(url_for('dashboard'))
+        card_order = study['practise_order']
+        idx = study['practise_index']
+        score = study['practise_score']
         if idx >= len(card_order):
             final_score = score
-            session.pop('practise_index', None)
-            session.pop('practise_score', None)
-            session.pop('practise_set_id', None)
-            session.pop('practise_order', None)
+            study.pop('practise_index', None)
+            study.pop('practise_score', None)
+            study.pop('practise_set_id', None)
+            study.pop('practise_order', None)
             flash(f'Practise complete! You scored {final_score} out of {len(card_order)}.', 'info')
             return render_template('practise_result.html', score=final_score, total=len(card_order), flashcard_set=flashcard_set)
-        current_card = cards[card_order[idx]]
+        current_card = study_card('practise', card_order[idx])
+        if current_card is None:
+            study['practise_index'] = idx + 1
+            return redirect(url_for('flashcard_practise', set_id=set_id, mode='classic'))
         if request.method == 'POST':
             user_answer = request.form.get('user_answer', '').strip()
             correct_answer = current_card.definition
-            similarity = SequenceMatcher(None, user_answer.lower(), correct_answer.lower()).ratio()
-            if similarity > 0.7:
+            grade = grade_answer(user_answer, correct_answer)
+            verdict = grade.verdict
+            if verdict == 'correct':
                 score += 1
                 flash('Correct!', 'info')
-                add_points_and_badges(User.query.get(session['user_id']), 10)
-                update_daily_challenge(1)
-            elif similarity > 0.4:
+                reward_answer(10, 1)
+            elif verdict == 'almost':
                 flash(f'Almost correct! The correct answer was: {correct_answer}', 'info')
-                add_points_and_badges(User.query.get(session['user_id']), 2)
+                reward_answer(2)
             else:
                 flash(f'Incorrect. The correct answer was: {correct_answer}', 'info')
+            log_answer('classic', current_card.id, verdict, grade.similarity, answer_latency_ms(study, 'practise', idx))
             idx += 1
-            session['practise_index'] = idx
-            session['practise_score'] = score
+            study['practise_index'] = idx
+            study['practise_score'] = score
             return redirect(url_for('flashcard_practise', set_id=set_id, mode='classic'))
+        mark_card_shown(study, 'practise', idx)
+        return render_template(
+            'practise.html',
+            term=current_card.term,
+            idx=idx + 1,
+            total=len(card_order),
+            score=score,
+            set_id=set_id,
+            flashcard_set=flashcard_set
+        )
+    elif mode == 'due':
+        if 'due_order' not in study or study.get('due_set_id') != set_id:
+            card_ids = due_card_ids(session['user_id'], set_id, app.config['DUE_SESSION_SIZE'])
+            if not card_ids or start_study_session(study, 'due', set_id, card_ids=card_ids) is None:
+                flash('No cards are due for review in this set.', 'info')
+                return redirect(url_for('flashcard_practise', set_id=set_id))
+        card_order = study['due_order']
+        idx = study['due_index']
+        score = study['due_score']
+        if idx >= len(card_order):
+            final_score = score
+            study.pop('due_index', None)
+            study.pop('due_score', None)
+            study.pop('due_set_id', None)
+            study.pop('due_order', None)
+            flash(f'Review complete! You scored {final_score} out of {len(card_order)}.', 'info')
+            return render_template('practise_result.html', score=final_score, total=len(card_order), flashcard_set=flashcard_set)
+        current_card = study_card('due', card_order[idx])
+        if current_card is None:
+            study['due_index'] = idx + 1
+            return redirect(url_for('flashcard_practise', set_id=set_id, mode='due'))
+        if request.method == 'POST':
+            user_answer = request.form.get('user_answer', '').strip()
+            correct_answer = current_card.definition
+            grade = grade_answer(user_answer, correct_answer)
+            verdict = grade.verdict
+            record_review(session['user_id'], set_id, current_card.id, verdict)
+            if verdict == 'correct':
+                score += 1
+                flash('Correct!', 'info')
+                reward_answer(10, 1)
+            elif verdict == 'almost':
+                flash(f'Almost correct! The correct answer was: {correct_answer}', 'info')
+                reward_answer(2)
+            else:
+                flash(f'Incorrect. The correct answer was: {correct_answer}', 'info')
+                db.session.commit()
+            log_answer('due', current_card.id, verdict, grade.similarity, answer_latency_ms(study, 'due', idx))
+            idx += 1
+            study['due_index'] = idx
+            study['due_score'] = score
+            return redirect(url_for('flashcard_practise', set_id=set_id, mode='due'))
+        mark_card_shown(study, 'due', idx)
         return render_template(
             'practise.html',
             term=current_card.term,
@@ -416,51 +988,43 @@ def flashcard_practise(set_id):
             flashcard_set=flashcard_set
         )
     elif mode == 'multiple_choice':
-        if len(cards) < 4:
-            flash('Need at least 4 cards for multiple choice mode.', 'info')
-            return redirect(url_for('dashboard'))
-        if 'mc_order' not in session or session.get('mc_set_id') != set_id or len(session.get('mc_order', [])) != len(cards):
-            card_order = list(range(len(cards)))
-            shuffle(card_order)
-            session['mc_order'] = card_order
-            session['mc_index'] = 0
-            session['mc_score'] = 0
-            session['mc_set_id'] = set_id
-        else:
-            card_order = session['mc_order']
-        idx = session['mc_index']
-        score = session['mc_score']
+        if 'mc_order' not in study or study.get('mc_set_id') != set_id:
+            if start_study_session(study, 'mc', set_id, min_cards=4) is None:
+                flash('Need at least 4 cards for multiple choice mode.', 'info')
+                return redirect(url_for('dashboard'))
+        card_order = study['mc_order']
+        idx = study['mc_index']
+        score = study['mc_score']
         if idx >= len(card_order):
             final_score = score
-            session.pop('mc_index', None)
-            session.pop('mc_score', None)
-            session.pop('mc_set_id', None)
-            session.pop('mc_order', None)
+            study.pop('mc_index', None)
+            study.pop('mc_score', None)
+            study.pop('mc_set_id', None)
+            study.pop('mc_order', None)
             flash(f'Practise complete! You scored {final_score} out of {len(card_order)}.', 'info')
             return render_template('game_result.html', score=final_score, total=len(card_order), flashcard_set=flashcard_set)
-        current_card = cards[card_order[idx]]
+        current_card = study_card('mc', card_order[idx])
+        if current_card is None:
+            study['mc_index'] = idx + 1
+            return redirect(url_for('flashcard_practise', set_id=set_id, mode='multiple_choice'))
         correct_answer = current_card.definition
-        options = [correct_answer]
-        other_defs = [c.definition for i, c in enumerate(cards) if i != card_order[idx]]
-        shuffle(other_defs)
-        while len(options) < 4 and other_defs:
-            option = other_defs.pop()
-            if option not in options:
-                options.append(option)
+        options = [correct_answer] + study_distractors('mc', card_order, current_card)
         shuffle(options)
         if request.method == 'POST':
             user_choice = request.form.get('choice')
             if user_choice == correct_answer:
                 score += 1
                 flash('Correct!', 'info')
-                add_points_and_badges(User.query.get(session['user_id']), 10)
-                update_daily_challenge(1)
+                reward_answer(10, 1)
             else:
                 flash(f'Incorrect. The correct answer was: {correct_answer}', 'info')
+            correct = user_choice == correct_answer
+            log_answer('multiple_choice', current_card.id, 'correct' if correct else 'incorrect', 1.0 if correct else 0.0, answer_latency_ms(study, 'mc', idx))
             idx += 1
-            session['mc_index'] = idx
-            session['mc_score'] = score
+            study['mc_index'] = idx
+            study['mc_score'] = score
             return redirect(url_for('flashcard_practise', set_id=set_id, mode='multiple_choice'))
+        mark_card_shown(study, 'mc', idx)
         return render_template(
             'multiple_choice.html',
             term=current_card.term,
@@ -472,38 +1036,36 @@ def flashcard_practise(set_id):
             flashcard_set=flashcard_set
         )
     elif mode == 'fill_blank':
-        fill_cards = [c for c in cards if len(c.definition.split()) >= 3]
         skip_words = {
             "a", "an", "the", "some", "and", "or", "but", "if", "then", "with", "of", "to", "for", "on", "in", "by", "at", "from", "as", "is", "are", "was", "were", "be", "been", "being", "that", "this", "these", "those", "it", "its", "their", "his", "her", "our", "your", "my", "i", "you", "he", "she", "they", "we", "not", "so", "do", "does", "did"
         }
-        if 'fb_order' not in session or session.get('fb_set_id') != set_id or len(session.get('fb_order', [])) != len(fill_cards):
-            card_order = list(range(len(fill_cards)))
-            shuffle(card_order)
-            session['fb_order'] = card_order
-            session['fb_index'] = 0
-            session['fb_score'] = 0
-            session['fb_set_id'] = set_id
-            session['fb_blank_index'] = {}
-        else:
-            card_order = session['fb_order']
+        if 'fb_order' not in study or study.get('fb_set_id') != set_id:
+            if start_study_session(study, 'fb', set_id, keep=lambda card: len(card.definition.split()) >= 3) is None:
+                flash('No cards in this set.')
+                return redirect(url_for('dashboard'))
+            study['fb_blank_index'] = {}
+        card_order = study['fb_order']
 
-        idx = session['fb_index']
-        score = session['fb_score']
+        idx = study['fb_index']
+        score = study['fb_score']
 
         if idx >= len(card_order):
             final_score = score
-            session.pop('fb_index', None)
-            session.pop('fb_score', None)
-            session.pop('fb_set_id', None)
-            session.pop('fb_order', None)
-            session.pop('fb_blank_index', None)
+            study.pop('fb_index', None)
+            study.pop('fb_score', None)
+            study.pop('fb_set_id', None)
+            study.pop('fb_order', None)
+            study.pop('fb_blank_index', None)
             flash(f'Practise complete! You scored {final_score} out of {len(card_order)}.', 'info')
             return render_template('game_result.html', score=final_score, total=len(card_order), flashcard_set=flashcard_set)
 
-        current_card = fill_cards[card_order[idx]]
+        current_card = study_card('fb', card_order[idx])
+        if current_card is None:
+            study['fb_index'] = idx + 1
+            return redirect(url_for('flashcard_practise', set_id=set_id, mode='fill_blank'))
         words = current_card.definition.split()
 
-        fb_blank_index = session.get('fb_blank_index', {})
+        fb_blank_index = study.get('fb_blank_index', {})
         if request.method == 'POST':
             blank_index = fb_blank_index.get(str(idx))
             if blank_index is None or blank_index >= len(words):
@@ -514,26 +1076,28 @@ def flashcard_practise(set_id):
             if user_input.lower() == correct_word.lower():
                 score += 1
                 flash('Correct!', 'info')
-                add_points_and_badges(User.query.get(session['user_id']), 10)
-                update_daily_challenge(1)
+                reward_answer(10, 1)
             else:
                 flash(f'Incorrect. The correct word was: {correct_word}', 'info')
+            correct = user_input.lower() == correct_word.lower()
+            log_answer('fill_blank', current_card.id, 'correct' if correct else 'incorrect', 1.0 if correct else 0.0, answer_latency_ms(study, 'fb', idx))
             idx += 1
-            session['fb_index'] = idx
-            session['fb_score'] = score
-            session['fb_blank_index'] = fb_blank_index
+            study['fb_index'] = idx
+            study['fb_score'] = score
+            study['fb_blank_index'] = fb_blank_index
             return redirect(url_for('flashcard_practise', set_id=set_id, mode='fill_blank'))
         else:
             if str(idx) not in fb_blank_index:
                 important_indices = [i for i, w in enumerate(words) if w.lower().strip(".,;:!?") not in skip_words and len(w) > 2]
                 blank_index = random.choice(important_indices) if important_indices else 0
                 fb_blank_index[str(idx)] = blank_index
-                session['fb_blank_index'] = fb_blank_index
+                study['fb_blank_index'] = fb_blank_index
             else:
                 blank_index = fb_blank_index[str(idx)]
             blanked = words[:]
             blanked[blank_index] = "____"
             blanked_definition = " ".join(blanked)
+            mark_card_shown(study, 'fb', idx)
 
         return render_template(
             'fill_blank.html',
@@ -586,12 +1150,16 @@ def account():
             if not check_password_hash(user.password, password):
                 flash('Password incorrect. Account not deleted.')
             else:
-                for flashcard_set in user.flashcard_sets:
-                    for card in flashcard_set.cards:
-                        db.session.delete(card)
-                    db.session.delete(flashcard_set)
-                db.session.delete(user)
+                review_log.flush()
+                db.session.execute(db.delete(CardReview).where(CardReview.user_id == user.id))
+                db.session.execute(db.delete(UserBadge).where(UserBadge.user_id == user.id))
+                db.session.execute(db.delete(ReviewEvent).where(ReviewEvent.user_id == user.id))
+                delete_sets([set_id for set_id, in db.session.query(FlashcardSet.id).filter_by(user_id=user.id)])
+                db.session.execute(db.delete(User).where(User.id == user.id))
                 db.session.commit()
+                ranking.remove(session['user_id'])
+                active_today['user_ids'].discard(session['user_id'])
+                user_stats_cache.pop(session['user_id'], None)
                 session.pop('user_id', None)
                 flash('Account deleted successfully.')
                 return redirect(url_for('index'))
@@ -605,20 +1173,180 @@ def account():
             else:
                 flash('Invalid theme selected.', 'danger')
     user_theme = session.get('theme', 'blue')
-    return render_template('account.html', user=user, user_theme=user_theme)
+    badges = [name for name, in db.session.query(UserBadge.name).filter_by(user_id=user.id).order_by(UserBadge.name)]
+    achievements = get_user_stats(user)['achievements']
+    return render_template('account.html', user=user, user_theme=user_theme, badges=badges, achievements=achievements)
+
+SEARCH_TOKEN = re.compile(r'\w+')
+
+# set_id and user_id are indexed so a MATCH on set_id : "N" or user_id : "N" only reads that set's or user's rows.
+SQLITE_SEARCH_SCHEMA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS flashcard_fts USING fts5("
+    "term, definition, tags, set_id, content='flashcard', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS flashcard_set_fts USING fts5("
+    "title, user_id, content='flashcard_set', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS flashcard_fts_ai AFTER INSERT ON flashcard BEGIN "
+    "INSERT INTO flashcard_fts(rowid, term, definition, tags, set_id) VALUES (new.id, new.term, new.definition, new.tags, new.set_id); END",
+    "CREATE TRIGGER IF NOT EXISTS flashcard_fts_ad AFTER DELETE ON flashcard BEGIN "
+    "INSERT INTO flashcard_fts(flashcard_fts, rowid, term, definition, tags, set_id) VALUES ('delete', old.id, old.term, old.definition, old.tags, old.set_id); END",
+    "CREATE TRIGGER IF NOT EXISTS flashcard_fts_au AFTER UPDATE ON flashcard BEGIN "
+    "INSERT INTO flashcard_fts(flashcard_fts, rowid, term, definition, tags, set_id) VALUES ('delete', old.id, old.term, old.definition, old.tags, old.set_id); "
+    "INSERT INTO flashcard_fts(rowid, term, definition, tags, set_id) VALUES (new.id, new.term, new.definition, new.tags, new.set_id); END",
+    "CREATE TRIGGER IF NOT EXISTS flashcard_set_fts_ai AFTER INSERT ON flashcard_set BEGIN "
+    "INSERT INTO flashcard_set_fts(rowid, title, user_id) VALUES (new.id, new.title, new.user_id); END",
+    "CREATE TRIGGER IF NOT EXISTS flashcard_set_fts_ad AFTER DELETE ON flashcard_set BEGIN "
+    "INSERT INTO flashcard_set_fts(flashcard_set_fts, rowid, title, user_id) VALUES ('delete', old.id, old.title, old.user_id); END",
+    "CREATE TRIGGER IF NOT EXISTS flashcard_set_fts_au AFTER UPDATE ON flashcard_set BEGIN "
+    "INSERT INTO flashcard_set_fts(flashcard_set_fts, rowid, title, user_id) VALUES ('delete', old.id, old.title, old.user_id); "
+    "INSERT INTO flashcard_set_fts(rowid, title, user_id) VALUES (new.id, new.title, new.user_id); END",
+    "INSERT INTO flashcard_fts(flashcard_fts) VALUES ('rebuild')",
+    "INSERT INTO flashcard_set_fts(flashcard_set_fts) VALUES ('rebuild')",
+]
+
+SQLITE_SEARCH_DROP = [
+    f'DROP TRIGGER IF EXISTS {table}_{event}' for table in ('flashcard_fts', 'flashcard_set_fts') for event in ('ai', 'ad', 'au')
+] + ['DROP TABLE IF EXISTS flashcard_fts', 'DROP TABLE IF EXISTS flashcard_set_fts']
+
+# The expressions must match the ones in the search queries for the GIN indexes to be used.
+POSTGRES_CARD_DOCUMENT = "to_tsvector('simple', coalesce(term, '') || ' ' || coalesce(definition, '') || ' ' || coalesce(tags, ''))"
+POSTGRES_SET_DOCUMENT = "to_tsvector('simple', title)"
+POSTGRES_SEARCH_SCHEMA = [
+    f"CREATE INDEX IF NOT EXISTS ix_flashcard_search ON flashcard USING GIN (({POSTGRES_CARD_DOCUMENT}))",
+    f"CREATE INDEX IF NOT EXISTS ix_flashcard_set_search ON flashcard_set USING GIN (({POSTGRES_SET_DOCUMENT}))",
+]
+
+# Search backend per database URL: 'fts5', 'postgresql' or 'like' when neither is available.
+search_backends = {}
+
+def search_backend():
+    url = str(db.engine.url)
+    if url in search_backends:
+        return search_backends[url]
+    backend = 'like'
+    dialect = db.engine.dialect.name
+    try:
+        with db.engine.begin() as conn:
+            if dialect == 'sqlite':
+                # The triggers live with the flashcard table, so a missing trigger means the index needs rebuilding.
+                ready = conn.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'flashcard_fts_ai'").first()
+                if not ready:
+                    for statement in SQLITE_SEARCH_SCHEMA:
+                        conn.exec_driver_sql(statement)
+                backend = 'fts5'
+            elif dialect == 'postgresql':
+                for statement in POSTGRES_SEARCH_SCHEMA:
+                    conn.exec_driver_sql(statement)
+                backend = 'postgresql'
+    except OperationalError:
+        app.logger.warning('Full-text search is unavailable on %s, falling back to LIKE queries', dialect)
+    search_backends[url] = backend
+    return backend
+
+def search_terms(query):
+    return SEARCH_TOKEN.findall(query.lower())
+
+def fts_match(column, value, terms):
+    # Restricts the MATCH to rows whose indexed column holds one of value's ids before the terms are matched.
+    values = ' OR '.join(f'"{v}"' for v in value) if isinstance(value, list) else f'"{value}"'
+    prefixes = ' '.join(f'"{term}"*' for term in terms)
+    text_columns = 'title' if column == 'user_id' else '{term definition tags}'
+    return f'{column} : ({values}) AND {text_columns} : ({prefixes})'
+
+def search_sets_for_user(user_id, query, page=1, per_page=None):
+    per_page = per_page or app.config['SEARCH_PAGE_SIZE']
+    terms = search_terms(query)
+    if not terms:
+        return [], False
+    params = {'user_id': user_id, 'limit': per_page + 1, 'offset': (page - 1) * per_page}
+    backend = search_backend()
+    if backend == 'fts5':
+        set_ids = [set_id for set_id, in db.session.query(FlashcardSet.id).filter_by(user_id=user_id)]
+        if not set_ids:
+            return [], False
+        # Title matches rank first (by bm25), then sets by how many of their cards match. Counting instead of
+        # scoring every matching card keeps a common word cheap for users with many cards.
+        params['title_match'] = fts_match('user_id', user_id, terms)
+        params['card_match'] = fts_match('set_id', set_ids, terms)
+        sql = """
+            SELECT hits.set_id, MIN(hits.title_score) AS title_score, SUM(hits.matches) AS matches FROM (
+                SELECT rowid AS set_id, bm25(flashcard_set_fts) AS title_score, 0 AS matches
+                FROM flashcard_set_fts WHERE flashcard_set_fts MATCH :title_match
+                UNION ALL
+                SELECT flashcard.set_id, NULL, COUNT(*)
+                FROM flashcard_fts JOIN flashcard ON flashcard.id = flashcard_fts.rowid
+                WHERE flashcard_fts MATCH :card_match GROUP BY flashcard.set_id
+            ) AS hits
+            GROUP BY hits.set_id ORDER BY title_score IS NULL, title_score, matches DESC, hits.set_id
+            LIMIT :limit OFFSET :offset
+        """
+    elif backend == 'postgresql':
+        params['match'] = ' & '.join(f'{term}:*' for term in terms)
+        sql = f"""
+            SELECT hits.set_id, MAX(hits.score) AS score FROM (
+                SELECT flashcard_set.id AS set_id, ts_rank({POSTGRES_SET_DOCUMENT}, q) * 2 AS score
+                FROM flashcard_set, to_tsquery('simple', :match) AS q
+                WHERE flashcard_set.user_id = :user_id AND {POSTGRES_SET_DOCUMENT} @@ q
+                UNION ALL
+                SELECT flashcard.set_id, ts_rank({POSTGRES_CARD_DOCUMENT}, q) AS score
+                FROM flashcard JOIN flashcard_set ON flashcard_set.id = flashcard.set_id, to_tsquery('simple', :match) AS q
+                WHERE flashcard_set.user_id = :user_id AND {POSTGRES_CARD_DOCUMENT} @@ q
+            ) AS hits
+            GROUP BY hits.set_id ORDER BY score DESC, hits.set_id LIMIT :limit OFFSET :offset
+        """
+    else:
+        params['pattern'] = f'%{query.lower()}%'
+        sql = """
+            SELECT DISTINCT flashcard_set.id FROM flashcard_set
+            LEFT JOIN flashcard ON flashcard.set_id = flashcard_set.id
+            WHERE flashcard_set.user_id = :user_id AND (
+                lower(flashcard_set.title) LIKE :pattern OR lower(flashcard.term) LIKE :pattern
+                OR lower(flashcard.definition) LIKE :pattern OR lower(flashcard.tags) LIKE :pattern
+            )
+            ORDER BY flashcard_set.id LIMIT :limit OFFSET :offset
+        """
+    ids = [row[0] for row in db.session.execute(text(sql), params)]
+    sets = {s.id: s for s in FlashcardSet.query.filter(FlashcardSet.id.in_(ids[:per_page]))} if ids else {}
+    return [sets[set_id] for set_id in ids[:per_page] if set_id in sets], len(ids) > per_page
+
+def search_cards_in_set(set_id, query, page=1, per_page=None):
+    per_page = per_page or app.config['SEARCH_PAGE_SIZE']
+    terms = search_terms(query)
+    if not terms:
+        return [], False
+    params = {'set_id': set_id, 'limit': per_page + 1, 'offset': (page - 1) * per_page}
+    backend = search_backend()
+    if backend == 'fts5':
+        params['match'] = fts_match('set_id', set_id, terms)
+        sql = """
+            SELECT rowid FROM flashcard_fts WHERE flashcard_fts MATCH :match
+            ORDER BY bm25(flashcard_fts), rowid LIMIT :limit OFFSET :offset
+        """
+    elif backend == 'postgresql':
+        params['match'] = ' & '.join(f'{term}:*' for term in terms)
+        sql = f"""
+            SELECT flashcard.id FROM flashcard, to_tsquery('simple', :match) AS q
+            WHERE flashcard.set_id = :set_id AND {POSTGRES_CARD_DOCUMENT} @@ q
+            ORDER BY ts_rank({POSTGRES_CARD_DOCUMENT}, q) DESC, flashcard.id LIMIT :limit OFFSET :offset
+        """
+    else:
+        params['pattern'] = f'%{query.lower()}%'
+        sql = """
+            SELECT id FROM flashcard
+            WHERE set_id = :set_id AND (lower(term) LIKE :pattern OR lower(definition) LIKE :pattern OR lower(tags) LIKE :pattern)
+            ORDER BY id LIMIT :limit OFFSET :offset
+        """
+    ids = [row[0] for row in db.session.execute(text(sql), params)]
+    cards = {c.id: c for c in Flashcard.query.filter(Flashcard.id.in_(ids[:per_page]))} if ids else {}
+    return [cards[card_id] for card_id in ids[:per_page] if card_id in cards], len(ids) > per_page
 
 @app.route('/search_sets', methods=['GET', 'POST'])
 def search_sets():
     if 'user_id' not in session:
         return redirect(url_for('login'))
-    user = User.query.get(session['user_id'])
-    results = []
-    query = ""
-    if request.method == 'POST':
-        query = request.form.get('query', '').strip().lower()
-        if query:
-            results = [s for s in user.flashcard_sets if query in s.title.lower()]
-    return render_template('search_sets.html', results=results, query=query)
+    query = request.values.get('query', '').strip().lower()
+    page = max(request.args.get('page', 1, type=int), 1)
+    results, has_next = search_sets_for_user(session['user_id'], query, page) if query else ([], False)
+    return render_template('search_sets.html', results=results, query=query, page=page, has_next=has_next)
 
 @app.route('/search_within_set/<int:set_id>', methods=['GET', 'POST'])
 def search_within_set(set_id):
@@ -628,16 +1356,95 @@ def search_within_set(set_id):
     if flashcard_set.user_id != session['user_id']:
         flash('Access denied')
         return redirect(url_for('dashboard'))
-    results = []
-    query = ""
-    if request.method == 'POST':
-        query = request.form.get('query', '').strip().lower()
-        if query:
-            results = [
-                card for card in flashcard_set.cards
-                if query in card.term.lower() or query in card.definition.lower()
-            ]
-    return render_template('search_within_set.html', flashcard_set=flashcard_set, results=results, query=query)
+    query = request.values.get('query', '').strip().lower()
+    page = max(request.args.get('page', 1, type=int), 1)
+    results, has_next = search_cards_in_set(set_id, query, page) if query else ([], False)
+    return render_template('search_within_set.html', flashcard_set=flashcard_set, results=results, query=query, page=page, has_next=has_next)
+
+def export_rows(*criteria):
+    # Server-side cursor over (set id, set title, term, definition), one set after another.
+    return db.session.execute(
+        db.select(FlashcardSet.id, FlashcardSet.title, Flashcard.term, Flashcard.definition)
+        .outerjoin(Flashcard, Flashcard.set_id == FlashcardSet.id)
+        .where(*criteria)
+        .order_by(FlashcardSet.id, Flashcard.id)
+        .execution_options(yield_per=500)
+    )
+
+def group_export_rows(rows):
+    for (_, title), set_rows in groupby(rows, key=lambda row: (row[0], row[1])):
+        yield title, ((term, definition) for _, _, term, definition in set_rows if term is not None)
+
+def json_set_pieces(title, cards, indent=''):
+    # Same layout as json.dumps({'title': ..., 'cards': [...]}, indent=2), one card at a time.
+    yield '{\n' + indent + '  "title": ' + json.dumps(title) + ',\n' + indent + '  "cards": ['
+    separator = '\n'
+    for term, definition in cards:
+        card = json.dumps({'term': term, 'definition': definition}, indent=2)
+        yield separator + indent + '    ' + card.replace('\n', '\n' + indent + '    ')
+        separator = ',\n'
+    yield ('\n' + indent + '  ]' if separator != '\n' else ']') + '\n' + indent + '}'
+
+def json_all_sets_pieces(sets):
+    yield '{\n  "sets": ['
+    separator = '\n'
+    for title, cards in sets:
+        yield separator + '    '
+        yield from json_set_pieces(title, cards, '    ')
+        separator = ',\n'
+    yield ('\n  ]' if separator != '\n' else ']') + '\n}'
+
+def csv_pieces(header, rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if buf.tell() >= 8192:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+def encode_chunks(pieces):
+    chunk_size = app.config['EXPORT_CHUNK_SIZE']
+    parts = []
+    size = 0
+    for piece in pieces:
+        data = piece.encode('utf-8')
+        parts.append(data)
+        size += len(data)
+        if size >= chunk_size:
+            yield b''.join(parts)
+            parts = []
+            size = 0
+    if parts:
+        yield b''.join(parts)
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def streamed_download(pieces, download_name, mimetype):
+    chunks = encode_chunks(pieces)
+    gzipped = app.config['EXPORT_GZIP'] and request.accept_encodings['gzip']
+    if gzipped:
+        chunks = gzip_chunks(chunks)
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    if gzipped:
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+    try:
+        download_name.encode('ascii')
+        response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii')
+        response.headers.set('Content-Disposition', 'attachment', filename=simple, **{'filename*': "UTF-8''" + quote(download_name, safe="!#$&+^`|~")})
+    return response
 
 @app.route('/export_set/<int:set_id>/<string:format>')
 def export_set(set_id, format):
@@ -647,32 +1454,132 @@ def export_set(set_id, format):
     if flashcard_set.user_id != session['user_id']:
         flash('Access denied')
         return redirect(url_for('dashboard'))
+    cards = ((term, definition) for _, _, term, definition in export_rows(FlashcardSet.id == set_id) if term is not None)
     if format == 'json':
-        data = {
-            'title': flashcard_set.title,
-            'cards': [
-                {'term': card.term, 'definition': card.definition}
-                for card in flashcard_set.cards
-            ]
-        }
-        buf = io.BytesIO()
-        buf.write(json.dumps(data, indent=2).encode('utf-8'))
-        buf.seek(0)
-        return send_file(buf, as_attachment=True, download_name=f"{flashcard_set.title}.json", mimetype='application/json')
+        pieces = json_set_pieces(flashcard_set.title, cards)
+        return streamed_download(pieces, f"{flashcard_set.title}.json", 'application/json')
     elif format == 'csv':
-        buf = io.StringIO()
-        writer = csv.writer(buf)
-        writer.writerow(['Term', 'Definition'])
-        for card in flashcard_set.cards:
-            writer.writerow([card.term, card.definition])
-        mem = io.BytesIO()
-        mem.write(buf.getvalue().encode('utf-8'))
-        mem.seek(0)
-        return send_file(mem, as_attachment=True, download_name=f"{flashcard_set.title}.csv", mimetype='text/csv')
+        pieces = csv_pieces(['Term', 'Definition'], cards)
+        return streamed_download(pieces, f"{flashcard_set.title}.csv", 'text/csv')
     else:
         flash('Unsupported export format.')
         return redirect(url_for('dashboard'))
 
+@app.route('/export_all/<string:format>')
+def export_all(format):
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    rows = export_rows(FlashcardSet.user_id == session['user_id'])
+    if format == 'json':
+        pieces = json_all_sets_pieces(group_export_rows(rows))
+        return streamed_download(pieces, "study_ace_sets.json", 'application/json')
+    elif format == 'csv':
+        pieces = csv_pieces(['Set', 'Term', 'Definition'], ((title, term, definition) for _, title, term, definition in rows if term is not None))
+        return streamed_download(pieces, "study_ace_sets.csv", 'text/csv')
+    else:
+        flash('Unsupported export format.')
+        return redirect(url_for('dashboard'))
+
+class JsonStream:
+    # Incremental reader over a binary JSON upload: values are decoded one at a
+    # time, so only the value being parsed has to be held in memory.
+    def __init__(self, stream, chunk_size=64 * 1024):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.json_decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        chunk = self.stream.read(self.chunk_size)
+        self.buf = self.buf[self.pos:] + self.decoder.decode(chunk, final=not chunk)
+        self.pos = 0
+        self.eof = not chunk
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                raise ValueError('Unexpected end of JSON file')
+            self._fill()
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' in JSON file")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buf, self.pos)
+                # A value ending exactly at the buffer edge may be a truncated number.
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+def iter_json_cards(stream):
+    reader = JsonStream(stream)
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+    while True:
+        key = reader.value()
+        reader.expect(':')
+        if key == 'cards':
+            reader.expect('[')
+            if reader.peek() == ']':
+                reader.pos += 1
+            else:
+                while True:
+                    card = reader.value()
+                    yield card['term'], card['definition']
+                    if reader.peek() != ',':
+                        break
+                    reader.pos += 1
+                reader.expect(']')
+        else:
+            reader.value()
+        if reader.peek() != ',':
+            break
+        reader.pos += 1
+    reader.expect('}')
+
+def iter_csv_cards(stream):
+    for row in csv.DictReader(codecs.iterdecode(stream, 'utf-8')):
+        yield row['Term'], row['Definition']
+
+def import_cards(set_id, cards):
+    batch_size = app.config['IMPORT_BATCH_SIZE']
+    max_cards = app.config['IMPORT_MAX_CARDS']
+    started = time.perf_counter()
+    count = 0
+    batch = []
+    for term, definition in cards:
+        count += 1
+        if count > max_cards:
+            raise ValueError(f'Sets can have at most {max_cards} cards.')
+        if not (isinstance(term, str) and term.strip() and isinstance(definition, str) and definition.strip()):
+            raise ValueError(f'Card {count} needs a non-empty term and definition.')
+        batch.append({'term': term, 'definition': definition, 'set_id': set_id, 'tags': ''})
+        if len(batch) >= batch_size:
+            db.session.bulk_insert_mappings(Flashcard, batch)
+            batch = []
+            elapsed = time.perf_counter() - started
+            app.logger.info('Import into set %s: %d cards (%.0f cards/s)', set_id, count, count / elapsed if elapsed else 0)
+    if batch:
+        db.session.bulk_insert_mappings(Flashcard, batch)
+    return count, time.perf_counter() - started
+
 @app.route('/import_set', methods=['GET', 'POST'])
 def import_set():
     if 'user_id' not in session:
@@ -685,29 +1592,26 @@ def import_set():
             flash('Please provide a file and a title for the set.')
             return redirect(url_for('import_set'))
         if format == 'json' and file.filename.endswith('.json'):
-            data = json.load(file)
-            new_set = FlashcardSet(title=title, user_id=session['user_id'])
-            db.session.add(new_set)
-            db.session.commit()
-            for card in data.get('cards', []):
-                db.session.add(Flashcard(term=card['term'], definition=card['definition'], set_id=new_set.id))
-            db.session.commit()
-            flash('Flashcard set imported successfully (JSON).')
-            return redirect(url_for('dashboard'))
+            cards = iter_json_cards(file.stream)
         elif format == 'csv' and file.filename.endswith('.csv'):
-            new_set = FlashcardSet(title=title, user_id=session['user_id'])
-            db.session.add(new_set)
-            db.session.commit()
-            stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-            reader = csv.DictReader(stream)
-            for row in reader:
-                db.session.add(Flashcard(term=row['Term'], definition=row['Definition'], set_id=new_set.id))
-            db.session.commit()
-            flash('Flashcard set imported successfully (CSV).')
-            return redirect(url_for('dashboard'))
+            cards = iter_csv_cards(file.stream)
         else:
             flash('Unsupported file format or mismatch.')
             return redirect(url_for('import_set'))
+        new_set = FlashcardSet(title=title, user_id=session['user_id'])
+        db.session.add(new_set)
+        try:
+            db.session.flush()
+            count, elapsed = import_cards(new_set.id, cards)
+        except (ValueError, KeyError, TypeError, UnicodeDecodeError, csv.Error) as e:
+            db.session.rollback()
+            flash(f'Could not import file: {e}')
+            return redirect(url_for('import_set'))
+        update_achievements(User.query.get(session['user_id']))
+        db.session.commit()
+        rate = count / elapsed if elapsed else count
+        flash(f'Flashcard set imported successfully ({format.upper()}): {count} cards at {rate:.0f} cards/s.')
+        return redirect(url_for('dashboard'))
     return render_template('import_set.html')
 
 def update_user_gamification(user):
@@ -729,36 +1633,186 @@ def update_user_gamification(user):
         else:
             user.streak = 1
         user.last_active = today
-        
+        return True
+    return False
+
+# Users whose activity has already been recorded today by this process.
+active_today = {'date': None, 'user_ids': set()}
+
 @app.before_request
 def gamification_before_request():
-    if 'user_id' in session:
-        user = User.query.get(session['user_id'])
-        if user:
-            update_user_gamification(user)
+    if 'user_id' not in session or request.endpoint == 'static':
+        return
+    today = str(datetime.date.today())
+    if active_today['date'] != today:
+        active_today['date'] = today
+        active_today['user_ids'] = set()
+    user_id = session['user_id']
+    if user_id in active_today['user_ids']:
+        return
+    user = User.query.get(user_id)
+    if user:
+        if update_user_gamification(user):
             db.session.commit()
+            user_stats_cache.pop(user_id, None)
+        active_today['user_ids'].add(user_id)
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers run alongside the single writer, and busy_timeout makes workers queue for the write lock.
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA busy_timeout=5000')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_request_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def time_request_query(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_started')
+    if started and has_request_context():
+        g.query_time = g.get('query_time', 0) + time.perf_counter() - started.pop()
+
+metrics = Metrics()
+metrics.describe('studyace_requests_total', 'counter', 'Requests handled, by endpoint, method and status.')
+metrics.describe('studyace_request_duration_seconds', 'histogram', 'Time from the start of a request to its response.')
+metrics.describe('studyace_request_queries', 'histogram', 'Database queries run per request.', QUERY_COUNT_BUCKETS)
+metrics.describe('studyace_request_query_seconds', 'histogram', 'Time spent in database queries per request.')
+metrics.describe('studyace_template_render_seconds', 'histogram', 'Time spent rendering each template.')
+profiler = SamplingProfiler(app.config['PROFILER_INTERVAL'])
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
 
-def add_points_and_badges(user, points_earned):
-    user.points = getattr(user, 'points', 0) + points_earned
-    badges = set(user.badges.split(',')) if user.badges else set()
+@app.after_request
+def record_request_metrics(response):
+    started = g.get('request_started')
+    if started is None:
+        return response
+    labels = {'endpoint': request.endpoint or 'unmatched', 'method': request.method}
+    metrics.inc('studyace_requests_total', {**labels, 'status': response.status_code})
+    metrics.observe('studyace_request_duration_seconds', labels, time.perf_counter() - started)
+    metrics.observe('studyace_request_queries', labels, g.get('query_count', 0))
+    metrics.observe('studyace_request_query_seconds', labels, g.get('query_time', 0))
+    return response
+
+@before_render_template.connect_via(app)
+def start_template_timer(sender, template, context, **extra):
+    g.setdefault('template_started', []).append(time.perf_counter())
+
+@template_rendered.connect_via(app)
+def record_template_render(sender, template, context, **extra):
+    started = g.get('template_started')
+    if started:
+        metrics.observe('studyace_template_render_seconds', {'template': template.name}, time.perf_counter() - started.pop())
+
+@app.route('/metrics')
+def metrics_endpoint():
+    if not app.config['METRICS_ENABLED']:
+        abort(404)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/profiler/<action>')
+def profiler_toggle(action):
+    # Folded stacks from /profiler/stop feed straight into flamegraph.pl or speedscope.
+    if not (app.debug or app.config['PROFILER_ENABLED']):
+        abort(404)
+    if action == 'start':
+        started = profiler.start()
+        return Response('Profiler started.\n' if started else 'Profiler already running.\n', mimetype='text/plain')
+    if action == 'stop':
+        return Response(profiler.stop(), mimetype='text/plain', headers={'Content-Disposition': 'attachment; filename=profile.folded'})
+    abort(404)
+
+@app.after_request
+def query_count_header(response):
+    count = g.get('query_count', 0)
+    if app.debug or app.config['QUERY_COUNT_HEADER']:
+        response.headers['X-Query-Count'] = str(count)
+    if app.debug or app.testing:
+        budget = app.config['QUERY_BUDGETS'].get(request.endpoint, app.config['QUERY_BUDGET'])
+        if budget is not None and count > budget:
+            message = f'{request.endpoint} ran {count} queries, over its budget of {budget}'
+            app.logger.warning(message)
+            if app.testing:
+                raise AssertionError(message)
+    return response
+
+def insert_if_absent(table, rows):
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        statement = sqlite_insert(table).on_conflict_do_nothing()
+    elif dialect == 'postgresql':
+        statement = postgresql_insert(table).on_conflict_do_nothing()
+    else:
+        statement = table.insert().prefix_with('IGNORE')
+    db.session.execute(statement, rows)
+
+def award_badges(user_id, names):
+    if names:
+        insert_if_absent(UserBadge.__table__, [{'user_id': user_id, 'name': name} for name in names])
+
+def migrate_user_badges():
+    # Copy badges from the old comma-separated User.badges column into user_badge (migration 0005).
+    names = {"7-day streak", "30-day streak", "100 points", "500 points", "Daily Challenge Winner"}
+    rows = []
+    for user_id, badges in db.session.query(User.id, User.badges).filter(User.badges != ''):
+        rows.extend({'user_id': user_id, 'name': name} for name in badges.split(',') if name in names)
+    if rows:
+        insert_if_absent(UserBadge.__table__, rows)
+    return len(rows)
+
+@app.cli.command('migrate-badges')
+def migrate_badges_command():
+    db.create_all()
+    copied = migrate_user_badges()
+    db.session.commit()
+    print(f'Copied {copied} badges.')
+
+def award_points(user, points_earned):
+    # A single UPDATE ... RETURNING, so concurrent awards for the same user are never lost.
+    points = db.session.execute(
+        db.update(User).where(User.id == user.id).values(
+            points=func.coalesce(User.points, 0) + points_earned
+        ).returning(User.points).execution_options(synchronize_session=False)
+    ).scalar_one()
+    set_committed_value(user, 'points', points)
+    badges = []
     if user.streak >= 7:
-        badges.add("7-day streak")
-    if user.points >= 100:
-        badges.add("100 points")
-    if user.points >= 500:
-        badges.add("500 points")
+        badges.append("7-day streak")
+    if points >= 100:
+        badges.append("100 points")
+    if points >= 500:
+        badges.append("500 points")
     if user.streak >= 30:
-        badges.add("30-day streak")
-    user.badges = ",".join(badges)
+        badges.append("30-day streak")
+    award_badges(user.id, badges)
+
+def reward_answer(points_earned, correct_increment=0):
+    # Points and daily challenge progress for one answer, saved with a single commit.
+    user = User.query.get(session['user_id'])
+    award_points(user, points_earned)
+    if correct_increment:
+        reward_points = advance_daily_challenge(user, correct_increment)
+        if reward_points:
+            flash(f'🎉 Daily Challenge completed! You earned {reward_points} bonus points and a badge!')
     db.session.commit()
+    ranking.update(user.id, user.points)
+    refresh_user_stats(user, recount=False)
 
-def calculate_achievements(user):
+def calculate_achievements(stats):
     achievements = set()
-    user_sets = [s for s in user.flashcard_sets if s.title != "Python (default)"]
-    total_sets = len(user_sets)
-    total_cards = sum(len(s.cards) for s in user_sets)
-    total_points = getattr(user, 'points', 0)
-    streak = getattr(user, 'streak', 0)
+    total_sets = stats['set_count']
+    total_cards = stats['card_count']
+    total_points = stats['points']
+    streak = stats['streak']
 
     if total_sets >= 1:
         achievements.add("Created your first set")
@@ -774,31 +1828,69 @@ def calculate_achievements(user):
         achievements.add("7-day streak")
     if streak >= 30:
         achievements.add("30-day streak")
-    if getattr(user, 'daily_challenge_completed', False):
+    if stats['daily_challenge_completed']:
         achievements.add("Completed today's daily challenge")
     return list(achievements)
 
+# Per-user dashboard aggregates, refreshed by set/card writes and the point functions. Set and card
+# counts are reused only while User.stats_version matches, so writes made by other workers are seen.
+user_stats_cache = LRUCache(app.config['STATS_CACHE_SIZE'])
+
+def count_user_sets_and_cards(user_id):
+    return db.session.query(
+        func.count(distinct(FlashcardSet.id)),
+        func.count(Flashcard.id)
+    ).select_from(FlashcardSet).outerjoin(Flashcard, Flashcard.set_id == FlashcardSet.id).filter(
+        FlashcardSet.user_id == user_id,
+        FlashcardSet.title != "Python (default)"
+    ).one()
+
+def refresh_user_stats(user, recount=True):
+    cached = user_stats_cache.get(user.id)
+    if recount or cached is None:
+        total_sets, total_cards = count_user_sets_and_cards(user.id)
+        answers, correct_answers = answer_counts(user.id)
+    else:
+        total_sets, total_cards = cached['set_count'], cached['card_count']
+        answers, correct_answers = cached['answers'], cached['correct_answers']
+    stats = {
+        'set_count': total_sets,
+        'card_count': total_cards,
+        'answers': answers,
+        'correct_answers': correct_answers,
+        'points': user.points or 0,
+        'streak': user.streak or 0,
+        'daily_challenge_completed': bool(user.daily_challenge_completed),
+        'version': user.stats_version,
+        'cached_at': time.monotonic() if recount or cached is None else cached['cached_at']
+    }
+    stats['achievements'] = calculate_achievements(stats)
+    user_stats_cache.put(user.id, stats)
+    return stats
+
+def get_user_stats(user):
+    stats = user_stats_cache.get(user.id)
+    if (stats is None or stats['version'] != user.stats_version
+            or time.monotonic() - stats['cached_at'] > app.config['STATS_CACHE_TTL']):
+        return refresh_user_stats(user)
+    # Points, streak and challenge come from the freshly loaded user; only the counts are reused.
+    return refresh_user_stats(user, recount=False)
+
 def update_achievements(user):
-    achievements = set(calculate_achievements(user))
-    user.badges = ",".join(achievements)
-    db.session.commit()
+    refresh_user_stats(user)
+    user.stats_version = User.stats_version + 1  # in SQL, so concurrent writers never lose a bump
+    user_stats_cache.pop(user.id)
 
 def get_user_rank(user_id):
-    users = User.query.order_by(User.points.desc()).all()
-    for idx, user in enumerate(users, 1):
-        if user.id == user_id:
-            return idx
-    return None
+    return ranking.rank(user_id)
 
 def get_daily_challenge():
     today = str(datetime.date.today())
     if 'user_id' in session:
         user = User.query.get(session['user_id'])
         if user.daily_challenge_date != today:
-            user.daily_challenge_date = today
-            user.daily_challenge_progress = 0
-            user.daily_challenge_completed = False
-            db.session.commit()
+            # Nothing recorded yet today; update_daily_challenge resets the row on the first answer.
+            return {'date': today, 'goal': 10, 'progress': 0, 'completed': False}
         return {
             'date': user.daily_challenge_date,
             'goal': 10,
@@ -817,26 +1909,53 @@ def get_daily_challenge():
             session['daily_challenge'] = challenge
         return challenge
 
-def update_daily_challenge(correct_increment=0):
+def advance_daily_challenge(user, correct_increment):
+    # Returns the bonus points awarded if this increment completed today's challenge, otherwise 0.
+    # Each step is a conditional UPDATE, so concurrent answers cannot lose progress or reward twice.
     today = str(datetime.date.today())
+    goal = 10
     reward_points = 50  # Points to award for completing daily challenge
     reward_badge = "Daily Challenge Winner"
+    unchanged = {'synchronize_session': False}
+    db.session.execute(db.update(User).where(
+        User.id == user.id,
+        or_(User.daily_challenge_date.is_(None), User.daily_challenge_date != today)
+    ).values(
+        daily_challenge_date=today,
+        daily_challenge_progress=0,
+        daily_challenge_completed=False
+    ).execution_options(**unchanged))
+    # Capped at the goal so bulk increments leave the same progress as answering one at a time
+    progress = func.coalesce(User.daily_challenge_progress, 0) + correct_increment
+    db.session.execute(db.update(User).where(
+        User.id == user.id,
+        User.daily_challenge_completed.is_not(True)
+    ).values(
+        daily_challenge_progress=case((progress > goal, goal), else_=progress)
+    ).execution_options(**unchanged))
+    completed = db.session.execute(db.update(User).where(
+        User.id == user.id,
+        User.daily_challenge_completed.is_not(True),
+        User.daily_challenge_progress >= goal
+    ).values(
+        daily_challenge_completed=True,
+        points=func.coalesce(User.points, 0) + reward_points
+    ).returning(User.id).execution_options(**unchanged)).first()
+    db.session.expire(user, ['points', 'daily_challenge_date', 'daily_challenge_progress', 'daily_challenge_completed'])
+    if completed is None:
+        return 0
+    award_badges(user.id, [reward_badge])
+    return reward_points
+
+def update_daily_challenge(correct_increment=0):
     if 'user_id' in session:
         user = User.query.get(session['user_id'])
-        if user.daily_challenge_date != today:
-            user.daily_challenge_date = today
-            user.daily_challenge_progress = 0
-            user.daily_challenge_completed = False
-        if not user.daily_challenge_completed:
-            user.daily_challenge_progress += correct_increment
-            if user.daily_challenge_progress >= 10:
-                user.daily_challenge_completed = True
-                user.points = getattr(user, 'points', 0) + reward_points
-                badges = set(user.badges.split(',')) if user.badges else set()
-                badges.add(reward_badge)
-                user.badges = ",".join(badges)
-                flash(f'🎉 Daily Challenge completed! You earned {reward_points} bonus points and a badge!')
+        reward_points = advance_daily_challenge(user, correct_increment)
+        if reward_points:
+            flash(f'🎉 Daily Challenge completed! You earned {reward_points} bonus points and a badge!')
         db.session.commit()
+        ranking.update(user.id, user.points)
+        refresh_user_stats(user, recount=False)
     else:
         challenge = get_daily_challenge()
         if not challenge['completed']:
@@ -846,6 +1965,125 @@ def update_daily_challenge(correct_increment=0):
                 flash('🎉 Daily Challenge completed!')
             session['daily_challenge'] = challenge
 
+def iter_grading_rows(stream):
+    reader = csv.DictReader(codecs.iterdecode(stream, 'utf-8'))
+    if not {'user', 'card_id', 'answer'} <= set(reader.fieldnames or ()):
+        raise ValueError('The CSV file needs user, card_id and answer columns.')
+    for row in reader:
+        card_id = (row['card_id'] or '').strip()
+        # A card_id that is not a number matches no card, so the row is counted as skipped.
+        yield (row['user'] or '').strip(), int(card_id) if card_id.isdigit() else None, (row['answer'] or '').strip()
+
+def bulk_grade(rows, owner_id=None):
+    # Grades (username, card_id, answer) rows the same way flashcard_practise does and applies the
+    # points and daily challenge progress in one transaction per user. With owner_id, only that
+    # user's own answers to cards in their own sets are graded; other rows are skipped.
+    started = time.perf_counter()
+    max_rows = app.config['BULK_GRADE_MAX_ROWS']
+    submissions = []
+    for row in rows:
+        submissions.append(row)
+        if len(submissions) > max_rows:
+            raise ValueError(f'At most {max_rows} answers can be graded at once.')
+    users = {}
+    usernames = list({username for username, _, _ in submissions})
+    for start in range(0, len(usernames), 500):
+        query = User.query.filter(User.username.in_(usernames[start:start + 500]))
+        if owner_id is not None:
+            query = query.filter(User.id == owner_id)
+        for user in query:
+            users[user.username] = user
+    definitions = {}
+    card_ids = list({card_id for _, card_id, _ in submissions})
+    for start in range(0, len(card_ids), 500):
+        query = db.session.query(Flashcard.id, Flashcard.definition).filter(Flashcard.id.in_(card_ids[start:start + 500]))
+        if owner_id is not None:
+            query = query.join(FlashcardSet, FlashcardSet.id == Flashcard.set_id).filter(FlashcardSet.user_id == owner_id)
+        definitions.update(query)
+    graded = [row for row in submissions if row[0] in users and row[1] in definitions]
+    grades = grade_many(
+        [(answer, definitions[card_id]) for _, card_id, answer in graded],
+        app.config['BULK_GRADE_WORKERS']
+    )
+    summary = {}
+    for (username, _, _), grade in zip(graded, grades):
+        counts = summary.setdefault(username, {'username': username, 'correct': 0, 'almost': 0, 'incorrect': 0, 'points': 0})
+        counts[grade.verdict] += 1
+    for username, counts in summary.items():
+        user = users[username]
+        points_before = user.points or 0
+        award_points(user, counts['correct'] * 10 + counts['almost'] * 2)
+        if counts['correct']:
+            advance_daily_challenge(user, counts['correct'])
+        counts['points'] = user.points - points_before
+        user_id, points = user.id, user.points
+        db.session.commit()
+        ranking.update(user_id, points)
+        stats = refresh_user_stats(user, recount=False)
+        stats['answers'] += counts['correct'] + counts['almost'] + counts['incorrect']
+        stats['correct_answers'] += counts['correct']
+    # Logged after the commits above, since the log writes on a connection of its own
+    graded_at = datetime.datetime.utcnow()
+    for (username, card_id, _), grade in zip(graded, grades):
+        review_log.add({
+            'user_id': users[username].id,
+            'card_id': card_id,
+            'mode': 'bulk',
+            'verdict': grade.verdict,
+            'similarity': grade.similarity,
+            'latency_ms': None,
+            'created_at': graded_at
+        })
+    review_log.flush()
+    return {
+        'graded': len(graded),
+        'skipped': len(submissions) - len(graded),
+        'elapsed': time.perf_counter() - started,
+        'users': sorted(summary.values(), key=lambda counts: counts['username']),
+        'results': [(username, card_id, grade.verdict) for (username, card_id, _), grade in zip(graded, grades)]
+    }
+
+def grading_rate(report):
+    return report['graded'] / report['elapsed'] if report['elapsed'] else report['graded']
+
+@app.route('/bulk_grade', methods=['GET', 'POST'])
+def bulk_grade_answers():
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    if request.method == 'POST':
+        file = request.files.get('file')
+        if not file or not file.filename.endswith('.csv'):
+            flash('Please provide a CSV file with user, card_id and answer columns.')
+            return redirect(url_for('bulk_grade_answers'))
+        try:
+            report = bulk_grade(iter_grading_rows(file.stream), owner_id=session['user_id'])
+        except (ValueError, KeyError, UnicodeDecodeError, csv.Error) as e:
+            db.session.rollback()
+            flash(f'Could not grade file: {e}')
+            return redirect(url_for('bulk_grade_answers'))
+        flash(f"Graded {report['graded']} answers at {grading_rate(report):.0f} answers/s ({report['skipped']} skipped).")
+        return render_template('bulk_grade.html', report=report)
+    return render_template('bulk_grade.html', report=None)
+
+@app.cli.command('grade-answers')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--output', type=click.Path(dir_okay=False), help='Write one verdict per graded row to this CSV file.')
+def grade_answers_command(path, output):
+    try:
+        with open(path, 'rb') as stream:
+            report = bulk_grade(iter_grading_rows(stream))
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        db.session.rollback()
+        raise click.ClickException(f'Could not grade {path}: {e}')
+    for counts in report['users']:
+        print(f"{counts['username']}: {counts['correct']} correct, {counts['almost']} almost, {counts['incorrect']} incorrect, +{counts['points']} points")
+    if output:
+        with open(output, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['user', 'card_id', 'verdict'])
+            writer.writerows(report['results'])
+    print(f"Graded {report['graded']} answers in {report['elapsed']:.2f}s ({grading_rate(report):.0f} answers/s), skipped {report['skipped']}.")
+
 @app.route('/set_theme/<theme>')
 def set_theme(theme):
     if theme not in ['blue', 'red', 'green', 'dark']:
@@ -865,20 +2103,186 @@ def review_by_tag(set_id):
     if flashcard_set.user_id != session['user_id']:
         flash('Access denied')
         return redirect(url_for('dashboard'))
-    all_tags = set()
-    for card in flashcard_set.cards:
-        if card.tags:
-            all_tags.update([t.strip() for t in card.tags.split(',') if t.strip()])
+    all_tags = [name for name, in db.session.query(Tag.name).join(card_tags).join(Flashcard).filter(
+        Flashcard.set_id == set_id
+    ).distinct().order_by(Tag.name)]
     selected_tag = request.args.get('tag', '')
     if selected_tag:
-        filtered_cards = [card for card in flashcard_set.cards if selected_tag in [t.strip() for t in (card.tags or '').split(',')]]
+        filtered_cards = Flashcard.query.join(card_tags).join(Tag).filter(
+            Flashcard.set_id == set_id,
+            Tag.name == selected_tag
+        ).order_by(Flashcard.id).all()
     else:
         filtered_cards = flashcard_set.cards
-    return render_template('review_by_tag.html', flashcard_set=flashcard_set, cards=filtered_cards, all_tags=sorted(all_tags), selected_tag=selected_tag)
+    return render_template('review_by_tag.html', flashcard_set=flashcard_set, cards=filtered_cards, all_tags=all_tags, selected_tag=selected_tag)
+
+@app.route('/review_tag')
+def review_tag():
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    all_tags = [name for name, in db.session.query(Tag.name).join(card_tags).join(Flashcard).join(FlashcardSet).filter(
+        FlashcardSet.user_id == session['user_id']
+    ).distinct().order_by(Tag.name)]
+    selected_tag = request.args.get('tag', '')
+    cards = []
+    if selected_tag:
+        cards = db.session.query(Flashcard, FlashcardSet.title).join(card_tags).join(Tag).join(FlashcardSet).filter(
+            Tag.name == selected_tag,
+            FlashcardSet.user_id == session['user_id']
+        ).order_by(Flashcard.set_id, Flashcard.id).all()
+    return render_template('review_tag.html', cards=cards, all_tags=all_tags, selected_tag=selected_tag)
+
+# Ordered schema revisions for databases created before a table's current definition. create_all only
+# adds missing tables, so indexes on existing tables arrive here. Statements must be idempotent.
+def add_column(table, column, definition):
+    # ALTER TABLE ... ADD COLUMN, skipped when create_all already made the column on a new database.
+    def apply():
+        if column not in {c['name'] for c in db.inspect(db.engine).get_columns(table)}:
+            db.session.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {definition}'))
+    return apply
+
+def rebuild_sqlite_search():
+    # Drops the SQLite search index so search_backend() recreates it from SQLITE_SEARCH_SCHEMA.
+    if db.engine.dialect.name == 'sqlite':
+        for statement in SQLITE_SEARCH_DROP:
+            db.session.execute(text(statement))
+        search_backends.pop(str(db.engine.url), None)
+
+def make_review_similarity_nullable():
+    # SQLite cannot drop NOT NULL in place, so the table is rebuilt from the model and its rows copied over.
+    column = next(c for c in db.inspect(db.engine).get_columns('review_event') if c['name'] == 'similarity')
+    if column['nullable']:
+        return
+    if db.engine.dialect.name != 'sqlite':
+        db.session.execute(text('ALTER TABLE review_event ALTER COLUMN similarity DROP NOT NULL'))
+        return
+    columns = ', '.join(column.name for column in ReviewEvent.__table__.columns)
+    db.session.execute(text('ALTER TABLE review_event RENAME TO review_event_old'))
+    for index in ReviewEvent.__table__.indexes:
+        db.session.execute(text(f'DROP INDEX IF EXISTS {index.name}'))
+    ReviewEvent.__table__.create(db.session.connection())
+    db.session.execute(text(f'INSERT INTO review_event ({columns}) SELECT {columns} FROM review_event_old'))
+    db.session.execute(text('DROP TABLE review_event_old'))
+
+MIGRATIONS = [
+    ('0001_hot_lookup_indexes', [
+        'CREATE INDEX IF NOT EXISTS ix_user_points ON "user" (points)',
+        'CREATE INDEX IF NOT EXISTS ix_flashcard_set_user_id ON flashcard_set (user_id)',
+        'CREATE INDEX IF NOT EXISTS ix_flashcard_set_id_id ON flashcard (set_id, id)',
+    ]),
+    ('0002_user_stats_version', [
+        add_column('user', 'stats_version', 'INTEGER NOT NULL DEFAULT 0'),
+    ]),
+    ('0003_search_owner_columns', [
+        rebuild_sqlite_search,
+    ]),
+    ('0004_nullable_review_similarity', [
+        make_review_similarity_nullable,
+    ]),
+    ('0005_user_badge_rows', [
+        migrate_user_badges,
+    ]),
+    ('0006_card_tag_rows', [
+        migrate_card_tags,
+    ]),
+]
+
+def upgrade_schema():
+    applied = {revision for revision, in db.session.query(SchemaMigration.revision)}
+    upgraded = []
+    for revision, statements in MIGRATIONS:
+        if revision in applied:
+            continue
+        for statement in statements:
+            if callable(statement):
+                statement()
+            else:
+                db.session.execute(text(statement))
+        db.session.add(SchemaMigration(revision=revision, applied_at=datetime.datetime.utcnow()))
+        db.session.commit()
+        upgraded.append(revision)
+    return upgraded
+
+def hot_queries():
+    return {
+        'login': db.select(User.id).where(User.username == 'someone'),
+        'leaderboard': db.select(User.id, User.points).order_by(User.points.desc(), User.id).limit(10),
+        'dashboard sets': db.select(FlashcardSet.id, FlashcardSet.title).where(FlashcardSet.user_id == 1),
+        'set cards': db.select(Flashcard.id, Flashcard.term).where(Flashcard.set_id == 1).order_by(Flashcard.id),
+        'card lookup': db.select(Flashcard.definition).where(Flashcard.id == 1),
+        'tagged cards': db.select(card_tags.c.card_id).where(card_tags.c.tag_id == 1),
+        'due cards': db.select(CardReview.card_id).where(
+            CardReview.user_id == 1, CardReview.set_id == 1, CardReview.due <= datetime.date.today()
+        ).order_by(CardReview.due).limit(20),
+    }
+
+def full_scans(statement):
+    # Table scans in the plan of statement. Scans of an index (SCAN ... USING INDEX) are fine.
+    sql = str(statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    dialect = db.engine.dialect.name
+    with db.engine.begin() as conn:
+        if dialect == 'sqlite':
+            details = [row[-1] for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql)]
+            return [detail for detail in details if detail.startswith('SCAN') and 'USING' not in detail]
+        if dialect == 'postgresql':
+            # Small tables are cheaper to scan, so ask whether an index path exists at all.
+            conn.exec_driver_sql('SET LOCAL enable_seqscan = off')
+            details = [row[0] for row in conn.exec_driver_sql('EXPLAIN ' + sql)]
+            return [detail.strip() for detail in details if 'Seq Scan' in detail]
+    return []
+
+def check_schema():
+    problems = []
+    inspector = db.inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    for table in db.metadata.sorted_tables:
+        if table.name not in tables:
+            problems.append(f'missing table {table.name}')
+            continue
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        problems += [f'missing column {table.name}.{column.name}' for column in table.columns if column.name not in columns]
+        indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        problems += [f'missing index {index.name} on {table.name}' for index in table.indexes if index.name not in indexes]
+    if 'schema_migration' in tables:
+        applied = {revision for revision, in db.session.query(SchemaMigration.revision)}
+        problems += [f'migration {revision} not applied' for revision, _ in MIGRATIONS if revision not in applied]
+    if not problems:
+        for name, statement in hot_queries().items():
+            problems += [f'{name} query does a full scan: {detail}' for detail in full_scans(statement)]
+    return problems
+
+@app.cli.command('upgrade-db')
+def upgrade_db_command():
+    db.create_all()
+    upgraded = upgrade_schema()
+    print(f"Applied {', '.join(upgraded)}." if upgraded else 'Schema is up to date.')
+
+@app.cli.command('check-schema')
+def check_schema_command():
+    problems = check_schema()
+    for problem in problems:
+        print(problem)
+    if problems:
+        raise SystemExit(1)
+    print('Schema and hot query plans are OK.')
+
+def init_database():
+    db.create_all()
+    upgrade_schema()
+    search_backend()
+
+def create_app():
+    # Production entry point, e.g. gunicorn -c gunicorn.conf.py "app:create_app()".
+    # Settings come from the environment (DATABASE_URL, SECRET_KEY, DB_POOL_SIZE, ...).
+    if not app.debug and app.config['SECRET_KEY'] in (None, '', DEV_SECRET_KEY):
+        raise RuntimeError('SECRET_KEY must be set in the environment outside debug mode.')
+    with app.app_context():
+        init_database()
+    return app
 
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        init_database()
     app.run(debug=True)
 
 # This program is a Flask web application for flashcard-based 
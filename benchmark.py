@@ -0,0 +1,543 @@
+import argparse
+import builtins
+import contextlib
+import datetime
+import gzip
+import io
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PASSWORD = 'benchmark-password'
+TERM_PATTERN = re.compile(r'<strong>Term:</strong>\s*(.*?)\s*<')
+WORDS = ['cell', 'membrane', 'protein', 'energy', 'nucleus', 'water', 'light', 'carbon', 'enzyme', 'gene',
+         'atom', 'force', 'mass', 'wave', 'field', 'charge', 'acid', 'base', 'salt', 'orbit']
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        'runs': len(samples),
+        'mean_ms': round(statistics.mean(samples) * 1000, 3),
+        'median_ms': round(statistics.median(samples) * 1000, 3),
+        'min_ms': round(ordered[0] * 1000, 3),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3)
+    }
+
+class Suite:
+    def __init__(self, repeat, only=None):
+        self.repeat = repeat
+        self.only = only
+        self.results = {}
+
+    def wanted(self, name):
+        return not self.only or any(part in name for part in self.only)
+
+    def measure(self, name, fn, repeat=None, before=None, **extra):
+        # Times fn() repeat times, running before() untimed ahead of each run.
+        # A failing benchmark is recorded instead of stopping the suite.
+        if not self.wanted(name):
+            return
+        samples = []
+        try:
+            for _ in range(repeat or self.repeat):
+                if before:
+                    before()
+                started = time.perf_counter()
+                fn()
+                samples.append(time.perf_counter() - started)
+        except Exception as e:
+            self.results[name] = {'error': f'{type(e).__name__}: {e}'}
+        else:
+            self.results[name] = {**summarize(samples), **extra}
+        print(f'{name}: {self.results[name]}', file=sys.stderr)
+
+    def record(self, name, fn):
+        if not self.wanted(name):
+            return
+        try:
+            self.results[name] = fn()
+        except Exception as e:
+            self.results[name] = {'error': f'{type(e).__name__}: {e}'}
+        print(f'{name}: {self.results[name]}', file=sys.stderr)
+
+def definition(rng, words=8):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+@contextlib.contextmanager
+def scripted_input(answer):
+    # Feeds the CLI's input() prompts from answer(prompt) and swallows its output.
+    original = builtins.input
+    builtins.input = lambda prompt='': answer(prompt)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        builtins.input = original
+
+# Web app
+
+def seed_web(users, sets, cards, seed):
+    from werkzeug.security import generate_password_hash
+    from app import db, User, FlashcardSet, Flashcard, init_database
+    rng = random.Random(seed)
+    init_database()
+    password = generate_password_hash(PASSWORD)
+    definitions = {}
+    for i in range(users):
+        user = User(username=f'bench{i}', password=password, points=rng.randrange(1000))
+        db.session.add(user)
+        db.session.flush()
+        for j in range(sets):
+            flashcard_set = FlashcardSet(title=f'Set {j} of bench{i}', user_id=user.id)
+            db.session.add(flashcard_set)
+            db.session.flush()
+            rows = [{'term': f'term{k}', 'definition': definition(rng), 'set_id': flashcard_set.id, 'tags': ''} for k in range(cards)]
+            db.session.bulk_insert_mappings(Flashcard, rows)
+            if i == 0:
+                definitions[flashcard_set.id] = {row['term']: row['definition'] for row in rows}
+    db.session.commit()
+    return definitions
+
+def login(client, username):
+    response = client.post('/login', data={'username': username, 'password': PASSWORD})
+    assert response.status_code == 302, response.status_code
+
+def check(response, *codes):
+    assert response.status_code in (codes or (200, 302)), f'{response.request.path} returned {response.status_code}'
+    return response
+
+def play_session(client, url, definitions, answer, limit):
+    # Answers every card of a practise session, then loads the result page.
+    answered = 0
+    for _ in range(limit + 1):
+        page = check(client.get(url), 200).get_data(as_text=True)
+        match = TERM_PATTERN.search(page)
+        if not match:
+            return answered
+        term = match.group(1)
+        check(client.post(url, data=answer(term, definitions.get(term, ''))), 302)
+        answered += 1
+    raise AssertionError(f'{url} did not finish after {limit} answers')
+
+def bench_web(suite, args):
+    from app import app, db, Flashcard, FlashcardSet, User, CardReview, bulk_grade, award_points, advance_daily_challenge
+    app.config['TESTING'] = True
+    if not os.path.isdir(os.path.join(app.root_path, app.template_folder)):
+        app.template_folder = app.root_path  # templates sit next to app.py in this checkout
+    with app.app_context():
+        definitions = seed_web(args.users, args.sets, args.cards, args.seed)
+    set_ids = sorted(definitions)
+    rng = random.Random(args.seed)
+    client = app.test_client()
+    login(client, 'bench0')
+    counter = iter(range(10 ** 9))
+
+    def signup():
+        fresh = app.test_client()
+        check(fresh.post('/signup', data={'username': f'signup{next(counter)}', 'password': PASSWORD}), 302)
+
+    suite.measure('web.signup', signup)
+    suite.measure('web.login', lambda: login(app.test_client(), 'bench1'))
+    suite.measure('web.dashboard', lambda: check(client.get('/dashboard'), 200))
+    suite.measure('web.leaderboard', lambda: check(client.get('/leaderboard'), 200))
+    suite.measure('web.review_set', lambda: check(client.get(f'/review/{set_ids[0]}'), 200))
+    suite.measure('web.search_sets', lambda: check(client.post('/search_sets', data={'query': 'set'}), 200))
+
+    def create_set():
+        terms = [f'new{i}' for i in range(20)]
+        check(client.post('/create_set', data={
+            'title': f'Created {next(counter)}', 'term': terms, 'definition': [definition(rng) for _ in terms]
+        }), 302)
+
+    suite.measure('web.create_set', create_set)
+    create_set()
+    with app.app_context():
+        edited_id = FlashcardSet.query.filter(FlashcardSet.title.like('Created %')).first().id
+
+    def edit_set():
+        page = client.get(f'/edit_set/{edited_id}').get_data(as_text=True)
+        card_ids = re.findall(r'name="card_id" value="(\d+)"', page)
+        terms = [f'edited{i}' for i in range(len(card_ids))] + ['added']
+        check(client.post(f'/edit_set/{edited_id}', data={
+            'title': 'Edited', 'card_id': card_ids + [''], 'term': terms,
+            'definition': [definition(rng) for _ in terms], 'tags': ['bench, edited'] * len(terms)
+        }), 302)
+
+    suite.measure('web.edit_set', edit_set)
+    suite.measure('web.export_set_json', lambda: check(client.get(f'/export_set/{set_ids[0]}/json'), 200).get_data())
+    suite.measure('web.export_set_csv', lambda: check(client.get(f'/export_set/{set_ids[0]}/csv'), 200).get_data())
+    suite.measure('web.export_all_json', lambda: check(client.get('/export_all/json'), 200).get_data())
+    import_payload = json.dumps({
+        'title': 'Imported', 'cards': [{'term': f'imp{i}', 'definition': definition(rng)} for i in range(args.import_cards)]
+    }).encode()
+
+    def import_set():
+        check(client.post('/import_set', data={
+            'title': f'Imported {next(counter)}', 'format': 'json', 'file': (io.BytesIO(import_payload), 'bench.json')
+        }, content_type='multipart/form-data'), 302)
+
+    # After the exports, so export_all does not include the imported set
+    suite.measure('web.import_set', import_set, repeat=1, cards=args.import_cards)
+
+    practise_set = set_ids[0]
+    cards = definitions[practise_set]
+
+    def typed(term, correct):
+        return {'user_answer': correct if rng.random() < 0.7 else definition(rng)}
+
+    modes = {
+        'classic': typed,
+        'due': typed,
+        'multiple_choice': lambda term, correct: {'choice': correct if rng.random() < 0.7 else 'wrong'},
+        'fill_blank': lambda term, correct: {'user_answer': rng.choice(correct.split())}
+    }
+
+    def make_due():
+        # Earlier sessions schedule every card for later; bring them back so the due queue is full.
+        with app.app_context():
+            db.session.execute(db.update(CardReview).where(CardReview.set_id == practise_set).values(due=datetime.date(2000, 1, 1)))
+            db.session.commit()
+
+    for mode, answer in modes.items():
+        url = f'/practise/{practise_set}?mode={mode}'
+        suite.measure(f'web.practise_{mode}', lambda: play_session(client, url, cards, answer, len(cards)),
+                      before=make_due if mode == 'due' else None, cards=len(cards))
+    suite.measure('web.game', lambda: play_session(client, f'/game/{practise_set}', cards, typed, len(cards)), cards=len(cards))
+
+    def grade_rows():
+        users = [f'bench{i}' for i in range(args.users)]
+        card_ids = list(range(1, args.cards * args.sets + 1))
+        rows = [(rng.choice(users), rng.choice(card_ids), definition(rng)) for _ in range(args.grade_answers)]
+        with app.test_request_context():
+            report = bulk_grade(rows)
+        return report
+
+    suite.measure('web.bulk_grade', grade_rows, repeat=1, answers=args.grade_answers)
+
+    def points_stress():
+        # Concurrent awards for one user must all land (atomic UPDATE ... SET points = points + n).
+        threads, awards = 8, 25
+        with app.app_context():
+            user_id = User.query.filter_by(username='bench1').first().id
+            before = db.session.get(User, user_id).points
+        errors = []
+
+        def worker():
+            for _ in range(awards):
+                with app.app_context():
+                    try:
+                        user = db.session.get(User, user_id)
+                        award_points(user, 1)
+                        advance_daily_challenge(user, 0)
+                        db.session.commit()
+                    except Exception as e:
+                        errors.append(repr(e))
+                        db.session.rollback()
+
+        started = time.perf_counter()
+        pool = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        with app.app_context():
+            after = db.session.get(User, user_id).points
+        expected = threads * awards - len(errors)
+        return {'awards': threads * awards, 'errors': len(errors), 'lost_updates': expected - (after - before),
+                'awards_per_s': round(threads * awards / elapsed, 1)}
+
+    suite.record('web.points_stress', points_stress)
+
+    def cookie_size(cards):
+        # Session cookie during a classic practise session, now and with the card order kept in the cookie as
+        # before the server-side study store (practise_order plus index, score and set id).
+        with app.app_context():
+            user_id = User.query.filter_by(username='bench0').first().id
+            flashcard_set = FlashcardSet(title=f'Cookie {cards}', user_id=user_id)
+            db.session.add(flashcard_set)
+            db.session.flush()
+            db.session.execute(db.insert(Flashcard), [
+                {'term': f'term{k}', 'definition': definition(rng), 'set_id': flashcard_set.id, 'tags': ''} for k in range(cards)
+            ])
+            set_id = flashcard_set.id
+            card_ids = [card_id for card_id, in db.session.query(Flashcard.id).filter_by(set_id=set_id)]
+            db.session.commit()
+        fresh = app.test_client()
+        login(fresh, 'bench0')
+        check(fresh.get(f'/practise/{set_id}?mode=classic'), 200)
+        after = fresh.get_cookie(app.config['SESSION_COOKIE_NAME']).value
+        random.Random(cards).shuffle(card_ids)
+        old_session = {'user_id': user_id, 'practise_order': card_ids, 'practise_index': 0, 'practise_score': 0, 'practise_set_id': set_id}
+        with app.test_request_context():
+            before = app.session_interface.get_signing_serializer(app).dumps(old_session)
+        return {'set_cards': cards, 'cookie_bytes_before': len(before), 'cookie_bytes_after': len(after),
+                'before_over_4kb': len(before) > 4096}
+
+    for cards in args.cookie_set_sizes:
+        suite.record(f'web.cookie_size.{cards}_cards', lambda: cookie_size(cards))
+
+# Search
+
+SEARCH_BENCHMARKS = ('search.sets_fts', 'search.sets_like', 'search.within_set_fts', 'search.within_set_like',
+                     'search.within_set_python_scan', 'search.small_user_sets_fts', 'search.small_user_sets_like')
+SMALL_USER_CARDS = 100  # cards of a second user, whose searches should not pay for the big user's cards
+RARE_WORD = 'mitochondria'
+
+def seed_search(cards, set_size, seed):
+    from werkzeug.security import generate_password_hash
+    from app import db, User, FlashcardSet, Flashcard
+    rng = random.Random(seed)
+    user = User(username='search0', password=generate_password_hash(PASSWORD))
+    db.session.add(user)
+    db.session.flush()
+    set_ids = []
+    for start in range(0, cards, set_size):
+        flashcard_set = FlashcardSet(title=f'Search set {start // set_size}', user_id=user.id)
+        db.session.add(flashcard_set)
+        db.session.flush()
+        set_ids.append(flashcard_set.id)
+        rows = []
+        for k in range(min(set_size, cards - start)):
+            text = definition(rng)
+            if rng.random() < 0.001:
+                text += ' ' + RARE_WORD
+            rows.append({'term': f'term{start + k}', 'definition': text, 'set_id': flashcard_set.id, 'tags': ''})
+        db.session.execute(db.insert(Flashcard), rows)  # the FTS triggers index every row
+    small_user = User(username='search1', password=generate_password_hash(PASSWORD))
+    db.session.add(small_user)
+    db.session.flush()
+    small_set = FlashcardSet(title='Small search set', user_id=small_user.id)
+    db.session.add(small_set)
+    db.session.flush()
+    db.session.execute(db.insert(Flashcard), [
+        {'term': f'small{k}', 'definition': definition(rng), 'set_id': small_set.id, 'tags': ''} for k in range(SMALL_USER_CARDS)
+    ])
+    db.session.commit()
+    return user.id, set_ids, small_user.id
+
+def bench_search(suite, args):
+    # Ranked full-text search against the LIKE scan it replaced for databases without FTS, and against
+    # the old in-Python scan of a set's cards.
+    if not any(suite.wanted(name) for name in SEARCH_BENCHMARKS):
+        return
+    from app import app, db, Flashcard, FlashcardSet, search_backend, search_backends, search_sets_for_user, search_cards_in_set
+    with app.app_context():
+        started = time.perf_counter()
+        user_id, set_ids, small_user_id = seed_search(args.search_cards, args.search_set_size, args.seed)
+        print(f'seeded {args.search_cards} cards for search in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+        url = str(db.engine.url)
+        backend = search_backend()
+
+        def with_backend(name, fn):
+            def run():
+                search_backends[url] = name
+                try:
+                    return fn()
+                finally:
+                    search_backends[url] = backend
+            return run
+
+        def python_scan(query):
+            # How search_within_set worked before: load every card of the set and test each one.
+            flashcard_set = db.session.get(FlashcardSet, set_ids[0])
+            results = [card for card in flashcard_set.cards if query in card.term.lower() or query in card.definition.lower()]
+            db.session.expire_all()
+            return results
+
+        for label, query in (('rare', RARE_WORD), ('common', 'enzyme')):
+            extra = {'cards': args.search_cards, 'query': query}
+            suite.measure(f'search.sets_fts.{label}', with_backend(backend, lambda: search_sets_for_user(user_id, query)), **extra)
+            suite.measure(f'search.sets_like.{label}', with_backend('like', lambda: search_sets_for_user(user_id, query)), **extra)
+            extra['set_cards'] = args.search_set_size
+            suite.measure(f'search.within_set_fts.{label}', with_backend(backend, lambda: search_cards_in_set(set_ids[0], query)), **extra)
+            suite.measure(f'search.within_set_like.{label}', with_backend('like', lambda: search_cards_in_set(set_ids[0], query)), **extra)
+            suite.measure(f'search.within_set_python_scan.{label}', lambda: python_scan(query), **extra)
+            extra['user_cards'] = SMALL_USER_CARDS
+            del extra['set_cards']
+            suite.measure(f'search.small_user_sets_fts.{label}', with_backend(backend, lambda: search_sets_for_user(small_user_id, query)), **extra)
+            suite.measure(f'search.small_user_sets_like.{label}', with_backend('like', lambda: search_sets_for_user(small_user_id, query)), **extra)
+
+# Grading
+
+def bench_grading(suite, args):
+    import grading
+    suite.record('grading.vs_sequence_matcher', lambda: grading.benchmark(cards=args.cards * 4))
+
+# Terminal version
+
+def cli_user_data(users, sets, cards, seed):
+    import flashcards
+    rng = random.Random(seed)
+    user_data = {}
+    for i in range(users):
+        flashcard_sets = {}
+        for j in range(sets):
+            terms = {}
+            for k in range(cards):
+                total = rng.randrange(10)
+                terms[f'term{k}'] = {'definition': definition(rng), 'correct': rng.randrange(total + 1), 'total': total}
+            correct = sum(term['correct'] for term in terms.values())
+            total = sum(term['total'] for term in terms.values())
+            flashcard_sets[f'Set {j}'] = {
+                'category': 'Bench',
+                'terms': terms,
+                'stats': {'correct': correct, 'total': total, 'percentage': correct / total * 100 if total else 0.0}
+            }
+        user_data[f'bench{i}'] = {'password': flashcards.hash_password(PASSWORD), 'flashcard_sets': flashcard_sets}
+    return user_data
+
+def serializer_table(suite, record, repeat):
+    # Size, encode and decode time of one user's file for every format and compression.
+    from user_store import Serializer, FORMATS, COMPRESSIONS
+    def measure(encode, decode):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            data = encode(record)
+        encoded = time.perf_counter()
+        for _ in range(repeat):
+            decode(data)
+        decoded = time.perf_counter()
+        return {'bytes': len(data), 'encode_ms': round((encoded - started) / repeat * 1000, 3),
+                'decode_ms': round((decoded - encoded) / repeat * 1000, 3)}
+
+    suite.record('cli.serializer.legacy_indented_json+gzip', lambda: measure(
+        lambda r: gzip.compress(json.dumps(r, indent=4).encode('utf-8')), lambda data: json.loads(gzip.decompress(data))))
+    for format in FORMATS:
+        for compression in COMPRESSIONS:
+            serializer = Serializer(format, compression)
+            suite.record(f'cli.serializer.{format}+{compression}', lambda: measure(serializer.dumps, serializer.loads))
+
+def save_legacy_file(user_data):
+    # How the terminal version used to save: every user, pretty-printed, in one gzip file.
+    with gzip.open('legacy.json.gz', 'wt', encoding='utf-8') as f:
+        json.dump(user_data, f, indent=4)
+
+def bench_cli(suite, args):
+    import flashcards
+    rng = random.Random(args.seed)
+    user_data = cli_user_data(args.cli_users, args.cli_sets, args.cli_cards, args.seed)
+    flash_cards = user_data['bench0']['flashcard_sets']['Set 0']
+    workdir = tempfile.mkdtemp(prefix='studyace-bench-cli-')
+    previous = os.getcwd()
+    os.chdir(workdir)  # the CLI keeps its data in the working directory
+    try:
+        flashcards.user_store = None
+        with gzip.open(flashcards.LEGACY_USER_DATA_FILE, 'wt', encoding='utf-8') as f:
+            json.dump(user_data, f)
+        serializer_table(suite, cli_user_data(1, 5, 50, args.seed)['bench0'], repeat=50)
+        suite.measure('cli.migrate_legacy_file', flashcards.get_user_store, repeat=1, users=args.cli_users)
+
+        def save_one_user():
+            flashcards.save_user_data(user_data, 'bench0')
+            flashcards.get_user_store().flush()
+
+        suite.measure('cli.save_user_data', save_one_user, users=args.cli_users)
+        suite.measure('cli.save_legacy_file', lambda: save_legacy_file(user_data), repeat=min(args.repeat, 2), users=args.cli_users)
+
+        def start_and_log_in():
+            # What login() does: open the store, find the account, check the password.
+            flashcards.user_store = None
+            data = flashcards.load_user_data()
+            assert 'bench0' in data and flashcards.verify_password(data['bench0']['password'], PASSWORD)
+
+        suite.measure('cli.start_and_log_in', start_and_log_in, users=args.cli_users)
+        suite.measure('cli.decode_all_users', lambda: dict(flashcards.load_user_data()), repeat=min(args.repeat, 2), users=args.cli_users)
+        with scripted_input(lambda prompt: ''):
+            suite.measure('cli.calculate_leaderboard', lambda: flashcards.calculate_leaderboard(flashcards.load_user_data(), username='bench0'),
+                          users=args.cli_users)
+            suite.measure('cli.calculate_leaderboard_last_page', lambda: flashcards.calculate_leaderboard(
+                flashcards.load_user_data(), page=args.cli_users, username='bench0'), users=args.cli_users)
+
+        def answer(prompt):
+            if prompt.startswith('Your choice'):
+                return str(rng.randint(1, 4))
+            if prompt.startswith('Your definition'):
+                return definition(rng)
+            return rng.choice(WORDS)
+
+        with scripted_input(answer):
+            suite.measure('cli.quiz_mode', lambda: flashcards.quiz_mode(flash_cards, flashcards.generate_daily_challenge()), cards=args.cli_cards)
+            suite.measure('cli.flash_card_game', lambda: flashcards.flash_card_game(flash_cards, flashcards.generate_daily_challenge()), cards=args.cli_cards)
+            suite.measure('cli.fill_in_the_blank_mode', lambda: flashcards.fill_in_the_blank_mode(flash_cards, flashcards.generate_daily_challenge()), cards=args.cli_cards)
+    finally:
+        flashcards.user_store = None
+        os.chdir(previous)
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=HERE, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+    print(f"{'benchmark':<32} {'baseline ms':>12} {'current ms':>12} {'change':>8}", file=sys.stderr)
+    for name, result in results.items():
+        old = baseline.get(name, {})
+        if 'median_ms' in result and 'median_ms' in old and old['median_ms']:
+            change = (result['median_ms'] - old['median_ms']) / old['median_ms'] * 100
+            print(f"{name:<32} {old['median_ms']:>12.3f} {result['median_ms']:>12.3f} {change:>+7.1f}%", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks for the web app, answer grading and the terminal version.')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--sets', type=int, default=5, help='sets per user')
+    parser.add_argument('--cards', type=int, default=50, help='cards per set')
+    parser.add_argument('--import-cards', type=int, default=100000, help='cards in the imported JSON file')
+    parser.add_argument('--grade-answers', type=int, default=5000)
+    parser.add_argument('--cli-users', type=int, default=10000, help='accounts in the terminal version benchmarks')
+    parser.add_argument('--cli-sets', type=int, default=2)
+    parser.add_argument('--cli-cards', type=int, default=20)
+    parser.add_argument('--cookie-set-sizes', type=int, nargs='+', default=[10, 100, 1000, 5000])
+    parser.add_argument('--search-cards', type=int, default=1000000, help='cards indexed for the search benchmarks')
+    parser.add_argument('--search-set-size', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--only', nargs='*', help='run benchmarks whose name contains one of these')
+    parser.add_argument('--output', help='write JSON results here instead of stdout')
+    parser.add_argument('--compare', help='print median changes against an earlier JSON result')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='studyace-bench-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['STUDY_SESSION_PATH'] = os.path.join(workdir, 'study_sessions.db')
+    sys.path.insert(0, HERE)
+
+    suite = Suite(args.repeat, args.only)
+    bench_grading(suite, args)
+    bench_cli(suite, args)
+    bench_web(suite, args)
+    bench_search(suite, args)
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'params': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')}
+        },
+        'results': suite.results
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.compare:
+        compare(suite.results, args.compare)
+
+if __name__ == '__main__':
+    main()
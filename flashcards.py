@@ -1,13 +1,16 @@
 import random
-import difflib
 import json
 import os
-import gzip
 import hashlib
 import csv
 import datetime
 import sys
 import platform
+import atexit
+import signal
+import heapq
+from grading import grade_answer
+from user_store import UserStore, LazyUserData, Serializer
 
 if platform.system() == "Windows":
     import msvcrt
@@ -21,15 +24,59 @@ def hash_password(password):
 def verify_password(stored_password, provided_password):
     return stored_password == hash_password(provided_password)
 
-def load_user_data():
-    if os.path.exists("user_data.json.gz"):
-        with gzip.open("user_data.json.gz", "rt", encoding="utf-8") as file:
-            return json.load(file)
-    return {}
+USER_DATA_DIR = "user_data"
+LEGACY_USER_DATA_FILE = "user_data.json.gz"
+SAVE_FLUSH_DELAY = 2.0  # seconds a save may wait so that back-to-back saves are written once
+LEADERBOARD_PAGE_SIZE = 10
+# json, marshal or pickle; none, gzip, zlib or lzma. Files in any format are read regardless,
+# so changing these only affects how users are written from then on.
+USER_DATA_FORMAT = "marshal"
+USER_DATA_COMPRESSION = "zlib"
+USER_DATA_COMPRESSION_LEVEL = None  # the compression's default
+user_store = None
+
+def get_user_store():
+    global user_store
+    if user_store is None:
+        serializer = Serializer(USER_DATA_FORMAT, USER_DATA_COMPRESSION, USER_DATA_COMPRESSION_LEVEL)
+        user_store = UserStore(USER_DATA_DIR, flush_delay=SAVE_FLUSH_DELAY, summarize=user_summary, serializer=serializer)
+        user_store.import_legacy(LEGACY_USER_DATA_FILE)
+        atexit.register(user_store.flush)
+    return user_store
+
+def flush_on_signals():
+    # Turn SIGTERM/SIGHUP into a normal exit so the atexit flush runs; Ctrl-C already unwinds to it.
+    for name in ("SIGTERM", "SIGHUP"):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), lambda signum, frame: sys.exit(128 + signum))
+
+def user_summary(record):
+    # Kept in the store's index so the leaderboard never decodes user files.
+    flashcard_sets = record.get("flashcard_sets", {})
+    return {
+        "correct": sum(fc["stats"]["correct"] for fc in flashcard_sets.values()),
+        "total": sum(fc["stats"]["total"] for fc in flashcard_sets.values())
+    }
 
-def save_user_data(user_data):
-    with gzip.open("user_data.json.gz", "wt", encoding="utf-8") as file:
-        json.dump(user_data, file, indent=4)
+def load_user_data():
+    # Only the index is read here; each user's file is decoded when that user is first accessed.
+    return LazyUserData(get_user_store())
+
+def save_user_data(user_data, username=None):
+    # With a username only that user's file is written (or removed if they are no longer in user_data).
+    store = get_user_store()
+    if username is not None:
+        store.save(username, user_data.get(username))
+        return
+    if isinstance(user_data, LazyUserData):
+        for name in user_data.touched():
+            store.save(name, user_data.get(name))
+        return
+    for name in store.usernames():
+        if name not in user_data:
+            store.save(name, None)
+    for name, record in user_data.items():
+        store.save(name, record)
 
 def input_password(prompt="Enter your password: ", mask="*"):
     print(prompt, end="", flush=True)
@@ -97,7 +144,7 @@ def login():
                     "password": hashed_password,
                     "flashcard_sets": {}
                 }
-                save_user_data(user_data)
+                save_user_data(user_data, new_username)
                 print(f"✅ Account created successfully! Welcome, {new_username}!")
                 return new_username, user_data
         elif username in user_data:
@@ -131,15 +178,15 @@ def flash_card_game(flash_cards, daily_challenge):
             print("Thanks for playing! Returning to the main menu...\n")
             break
         correct_answer = flash_cards["terms"][term]["definition"]
-        similarity = difflib.SequenceMatcher(None, user_answer.lower(), correct_answer.lower()).ratio()
+        verdict = grade_answer(user_answer, correct_answer).verdict
         flash_cards["terms"][term]["total"] += 1
         flash_cards["stats"]["total"] += 1
-        if similarity > 0.7:
+        if verdict == "correct":
             print("✅ Correct!\n")
             score += 1
             flash_cards["terms"][term]["correct"] += 1
             flash_cards["stats"]["correct"] += 1
-        elif similarity > 0.4:
+        elif verdict == "almost":
             print(f"Almost correct! Here's a hint: {correct_answer[:len(correct_answer)//2]}...\n")
         else:
             print(f"❌ Incorrect. The correct definition is: {correct_answer}\n")
@@ -155,6 +202,9 @@ def flash_card_game(flash_cards, daily_challenge):
 def calculate_user_level(flashcard_sets):
     total_correct = sum(fc["stats"]["correct"] for fc in flashcard_sets.values())
     total_attempts = sum(fc["stats"]["total"] for fc in flashcard_sets.values())
+    return level_for(total_correct, total_attempts)
+
+def level_for(total_correct, total_attempts):
     if total_attempts == 0:
         return "Unranked"
     pct = (total_correct / total_attempts) * 100
@@ -215,7 +265,7 @@ def edit_flashcard_set(flashcard_set):
         else:
             print("❌ Invalid choice. Please enter 1, 2, or 3.\n")
 
-def edit_flashcard_set_menu(flashcard_sets, user_data):
+def edit_flashcard_set_menu(flashcard_sets, user_data, username):
     while True:
         print("\nEdit Flashcard Sets Menu:")
         print("1. Edit terms in a flashcard set")
@@ -226,7 +276,7 @@ def edit_flashcard_set_menu(flashcard_sets, user_data):
             set_name = input("Enter the name of the flashcard set you want to edit: ").strip()
             if set_name in flashcard_sets:
                 edit_flashcard_set(flashcard_sets[set_name])
-                save_user_data(user_data)
+                save_user_data(user_data, username)
             else:
                 print(f"No flashcard set named '{set_name}' found. Please try again.")
         elif choice == "2":
@@ -236,7 +286,7 @@ def edit_flashcard_set_menu(flashcard_sets, user_data):
                     print("The default flashcard set cannot be deleted.")
                 else:
                     del flashcard_sets[set_name]
-                    save_user_data(user_data)
+                    save_user_data(user_data, username)
                     print(f"Flashcard set '{set_name}' deleted successfully!")
             else:
                 print(f"No flashcard set named '{set_name}' found. Please try again.")
@@ -262,7 +312,7 @@ def update_streak(user_data, username):
     streak_data["last_active"] = today
     streak_data["max_streak"] = max(streak_data["max_streak"], streak_data["current_streak"])
     user_data[username]["streak"] = streak_data
-    save_user_data(user_data)
+    save_user_data(user_data, username)
     return streak_data
 
 def calculate_badges(user_data, username):
@@ -297,6 +347,7 @@ def calculate_achievements(flashcard_sets):
     return achievements
 
 def manage_account(username, user_data):
+    # Returns the username, which changes if the user renames their account.
     while True:
         print("\nAccount Management:")
         print("1. View account details")
@@ -336,13 +387,14 @@ def manage_account(username, user_data):
                     print("❌ This username is already taken. Please try again.")
                 else:
                     user_data[new_username] = user_data.pop(username)
+                    save_user_data(user_data, new_username)
+                    save_user_data(user_data, username)
                     username = new_username
-                    save_user_data(user_data)
                     print(f"✅ Your username has been updated to '{new_username}'.")
             elif edit_choice == "2":
                 new_password = input_password("Enter your new password: ").strip()
                 user_data[username]["password"] = hash_password(new_password)
-                save_user_data(user_data)
+                save_user_data(user_data, username)
                 print("✅ Your password has been updated successfully.")
             else:
                 print("❌ Invalid choice. Please enter 1 or 2.\n")
@@ -352,7 +404,7 @@ def manage_account(username, user_data):
                 password = input_password("Enter your password to confirm account deletion: ").strip()
                 if verify_password(user_data[username]["password"], password):
                     del user_data[username]
-                    save_user_data(user_data)
+                    save_user_data(user_data, username)
                     print("✅ Your account has been deleted. Goodbye!")
                     exit()
                 else:
@@ -361,7 +413,7 @@ def manage_account(username, user_data):
                 print("❌ Account deletion canceled.")
         elif choice == "4":
             print("Returning to the main menu...\n")
-            break
+            return username
         else:
             print("❌ Invalid choice. Please enter 1, 2, 3, or 4.\n")
 
@@ -465,27 +517,58 @@ def display_daily_challenge(challenge):
     print(f"- Progress: {challenge['progress']}/{challenge['goal']}")
     print(f"- Completed: {'Yes' if challenge['completed'] else 'No'}\n")
 
-def calculate_leaderboard(user_data):
-    leaderboard = []
-    for username, data in user_data.items():
-        flashcard_sets = data.get("flashcard_sets", {})
-        total_correct = sum(flashcard_sets[set_name]["stats"]["correct"] for set_name in flashcard_sets)
-        total_attempts = sum(flashcard_sets[set_name]["stats"]["total"] for set_name in flashcard_sets)
-        accuracy = (total_correct / total_attempts * 100) if total_attempts > 0 else 0
-        level = calculate_user_level(flashcard_sets)
-        leaderboard.append({
-            "username": username,
-            "accuracy": accuracy,
-            "level": level,
-            "total_correct": total_correct,
-            "total_attempts": total_attempts
-        })
-    leaderboard.sort(key=lambda x: x["accuracy"], reverse=True)
-    print("\nLeaderboard:")
+def leaderboard_summaries(user_data):
+    if isinstance(user_data, LazyUserData):
+        return user_data.summaries()
+    return [{"user": username, **user_summary(data)} for username, data in user_data.items()]
+
+def accuracy_of(summary):
+    return (summary["correct"] / summary["total"] * 100) if summary["total"] > 0 else 0
+
+def leaderboard_key(summary):
+    return (-accuracy_of(summary), summary["user"])
+
+def leaderboard_rank(summaries, username):
+    # Position of username without sorting everyone: one more than the number ranked above them.
+    mine = next((summary for summary in summaries if summary["user"] == username), None)
+    if mine is None:
+        return None
+    key = leaderboard_key(mine)
+    return 1 + sum(1 for summary in summaries if leaderboard_key(summary) < key)
+
+def calculate_leaderboard(user_data, page=1, page_size=LEADERBOARD_PAGE_SIZE, username=None):
+    summaries = leaderboard_summaries(user_data)
+    pages = max(1, -(-len(summaries) // page_size))
+    page = min(max(page, 1), pages)
+    # Only the top page * page_size entries are ordered, using a heap instead of a full sort.
+    top = heapq.nsmallest(page * page_size, summaries, key=leaderboard_key)
+    print(f"\nLeaderboard (page {page} of {pages}):")
     print(f"{'Rank':<5} {'Username':<15} {'Level':<12} {'Accuracy (%)':<12} {'Correct':<10} {'Attempts':<10}")
-    for rank, entry in enumerate(leaderboard, start=1):
-        print(f"{rank:<5} {entry['username']:<15} {entry['level']:<12} {entry['accuracy']:<12.2f} {entry['total_correct']:<10} {entry['total_attempts']:<10}")
+    for rank, entry in enumerate(top[(page - 1) * page_size:], start=(page - 1) * page_size + 1):
+        level = level_for(entry["correct"], entry["total"])
+        print(f"{rank:<5} {entry['user']:<15} {level:<12} {accuracy_of(entry):<12.2f} {entry['correct']:<10} {entry['total']:<10}")
+    if username is not None:
+        rank = leaderboard_rank(summaries, username)
+        if rank is not None:
+            print(f"\nYour rank: {rank} of {len(summaries)}")
     print()
+    return pages
+
+def leaderboard_menu(user_data, username):
+    page = 1
+    while True:
+        pages = calculate_leaderboard(user_data, page, username=username)
+        choice = input("Enter 'n' for the next page, 'p' for the previous page, 'm' for your rank, or press Enter to return: ").strip().lower()
+        if choice == "n" and page < pages:
+            page += 1
+        elif choice == "p" and page > 1:
+            page -= 1
+        elif choice == "m":
+            rank = leaderboard_rank(leaderboard_summaries(user_data), username)
+            if rank is not None:
+                page = (rank - 1) // LEADERBOARD_PAGE_SIZE + 1
+        elif choice == "":
+            break
     
 def search_flashcard_set(flashcard_set):
     query = input("Enter a term or definition to search for: ").strip().lower()
@@ -667,7 +750,7 @@ def main_menu():
             },
             "stats": {"correct": 0, "total": 0, "percentage": 0.0}
         }
-        save_user_data(user_data)
+        save_user_data(user_data, username)
     while True:
         user_level = calculate_user_level(flashcard_sets)
         display_header(f"Main Menu (Logged in as: {username} - Level: {user_level})")
@@ -683,6 +766,7 @@ def main_menu():
         print("10. Manage account")
         print("11. Save and Exit")
         display_separator()
+        get_user_store().flush()  # nothing is left unsaved while the menu waits for input
         choice = input("Enter your choice (1-11): ").strip()
         os.system('cls' if os.name == 'nt' else 'clear')
         if choice == "1":
@@ -696,7 +780,7 @@ def main_menu():
                     "terms": {},
                     "stats": {"correct": 0, "total": 0, "percentage": 0.0}
                 }
-                save_user_data(user_data)
+                save_user_data(user_data, username)
                 print(f"Flashcard set '{set_name}' created successfully under the category '{category}'!")
                 display_separator()
                 while True:
@@ -709,7 +793,7 @@ def main_menu():
                     else:
                         definition = input(f"Enter the definition for '{term}': ").strip()
                         flashcard_sets[set_name]["terms"][term] = {"definition": definition, "correct": 0, "total": 0}
-                        save_user_data(user_data)
+                        save_user_data(user_data, username)
                         print(f"Added: {term} -> {definition}")
                         display_separator()
         elif choice == "2":
@@ -743,7 +827,7 @@ def main_menu():
             else:
                 print("Invalid choice. Returning to the main menu.\n")
         elif choice == "3":
-            edit_flashcard_set_menu(flashcard_sets, user_data)
+            edit_flashcard_set_menu(flashcard_sets, user_data, username)
         elif choice == "4":
             flashcard_games_menu(flashcard_sets, daily_challenge)
         elif choice == "5":
@@ -768,7 +852,7 @@ def main_menu():
         elif choice == "6":
             display_daily_challenge(daily_challenge)
         elif choice == "7":
-            calculate_leaderboard(load_user_data())
+            leaderboard_menu(user_data, username)
         elif choice == "8":
             set_name = input("Enter the name of the flashcard set you want to search in: ").strip()
             if set_name in flashcard_sets:
@@ -778,10 +862,11 @@ def main_menu():
         elif choice == "9":
             manage_flashcard_import_export(flashcard_sets)
         elif choice == "10":
-            manage_account(username, user_data)
+            username = manage_account(username, user_data)
         elif choice == "11":
             user_data[username]["flashcard_sets"] = flashcard_sets
-            save_user_data(user_data)
+            save_user_data(user_data, username)
+            get_user_store().flush()
             print("Your progress has been saved. Goodbye!")
             break
         else:
@@ -790,6 +875,7 @@ def main_menu():
     exit()
 
 if __name__ == "__main__":
+    flush_on_signals()
     main_menu()
 
 # This program is a comprehensive flashcard management and learning system designed to help users create, manage, and study flashcards effectively. 
@@ -799,7 +885,9 @@ if __name__ == "__main__":
 # 1. **User Authentication**:
 #    - Users can log in with a username and password or create a new account.
 #    - Passwords are securely hashed using SHA-256 before being stored.
-#    - User data, including flashcard sets and progress, is saved in a compressed JSON file (`user_data.json.gz`).
+#    - User data, including flashcard sets and progress, is saved in the `user_data` directory, one compressed file per user
+#      (marshal and zlib by default; JSON, pickle, gzip and lzma can be chosen and are detected when reading).
+#    - An existing `user_data.json.gz` from older versions is migrated on first start.
 
 # 2. **Flashcard Management**:
 #    - Users can create flashcard sets, add terms and definitions, and edit or delete existing sets.
@@ -828,6 +916,7 @@ if __name__ == "__main__":
 
 # 7. **Leaderboard**:
 #    - A leaderboard ranks users based on their accuracy percentage and displays their level, total correct answers, and total attempts.
+#    - It is paged, can jump to the user's own rank, and reads per-user totals kept in the store's index instead of every user's file.
 
 # 8. **Import/Export**:
 #    - Users can export flashcard sets to JSON or CSV files and import sets from these formats.
@@ -838,7 +927,9 @@ if __name__ == "__main__":
 
 # 10. **Technical Details**:
 #     - The program uses cross-platform password masking for secure input.
-#     - Data is saved and loaded efficiently using gzip compression.
+#     - Saving a change rewrites only the current user's file; an append-only index lists the accounts.
+#     - Files are replaced atomically (temporary file, fsync, rename), and saves made close together are written once,
+#       before the main menu waits for input, and on exit.
 #     - The terminal is cleared between actions for a clean user interface.
 
 # Overall, this program provides a robust and engaging platform for learning and mastering any subject through flashcards. It combines effective study techniques with gamification elements to keep users motivated and track their progress over time.
\ No newline at end of file
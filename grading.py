@@ -0,0 +1,117 @@
+import copy
+import multiprocessing
+import random
+import string
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from difflib import SequenceMatcher
+from functools import lru_cache
+
+CORRECT_THRESHOLD = 0.7
+ALMOST_THRESHOLD = 0.4
+PARALLEL_MIN_ANSWERS = 2000  # below this a process pool costs more than it saves
+CHUNK_SIZE = 500
+
+# similarity is the SequenceMatcher ratio, or None when a quick upper bound already settled 'incorrect'
+Grade = namedtuple('Grade', 'verdict similarity')
+
+@lru_cache(maxsize=4096)
+def prepared_matcher(correct):
+    # SequenceMatcher analyses its second sequence once, so keep that work per correct answer
+    matcher = SequenceMatcher(None, '', correct)
+    matcher.quick_ratio()  # fills the cached character counts as well
+    return matcher
+
+def verdict(similarity):
+    if similarity > CORRECT_THRESHOLD:
+        return 'correct'
+    if similarity > ALMOST_THRESHOLD:
+        return 'almost'
+    return 'incorrect'
+
+def grade_answer(user_answer, correct_answer):
+    answer = user_answer.lower()
+    correct = correct_answer.lower()
+    if answer == correct:
+        return Grade('correct', 1.0)
+    matcher = copy.copy(prepared_matcher(correct))
+    matcher.set_seq1(answer)
+    # Both quick ratios are upper bounds on ratio(), so a low one settles 'incorrect' without matching
+    for bound in (matcher.real_quick_ratio, matcher.quick_ratio):
+        if bound() <= ALMOST_THRESHOLD:
+            return Grade('incorrect', None)
+    similarity = matcher.ratio()
+    return Grade(verdict(similarity), similarity)
+
+def grade_chunk(pairs):
+    return [grade_answer(user_answer, correct_answer) for user_answer, correct_answer in pairs]
+
+def grade_many(pairs, workers=None):
+    # Grades (user_answer, correct_answer) pairs, in parallel for large batches; grades keep input order.
+    pairs = list(pairs)
+    if workers == 1 or len(pairs) < PARALLEL_MIN_ANSWERS:
+        return grade_chunk(pairs)
+    # Answers to the same card go to the same chunk so each worker's matcher cache gets hits
+    order = sorted(range(len(pairs)), key=lambda i: pairs[i][1])
+    chunks = [[pairs[i] for i in order[start:start + CHUNK_SIZE]] for start in range(0, len(order), CHUNK_SIZE)]
+    grades = [None] * len(pairs)
+    position = 0
+    # Never fork: the caller may be a multi-threaded server worker.
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method)) as pool:
+        for chunk_grades in pool.map(grade_chunk, chunks):
+            for result in chunk_grades:
+                grades[order[position]] = result
+                position += 1
+    return grades
+
+def reference_grade(user_answer, correct_answer):
+    return verdict(SequenceMatcher(None, user_answer.lower(), correct_answer.lower()).ratio())
+
+def sample_answers(correct, rng):
+    words = correct.split()
+    yield correct
+    yield correct.upper()
+    typo = list(correct)
+    for _ in range(max(1, len(typo) // 40)):
+        typo[rng.randrange(len(typo))] = rng.choice(string.ascii_lowercase)
+    yield ''.join(typo)
+    yield ' '.join(words[:len(words) // 2])
+    yield ' '.join(words[:len(words) // 4])
+    yield ' '.join(rng.sample(words, len(words)))
+    yield ''.join(rng.choice(string.ascii_lowercase + ' ') for _ in range(len(correct)))
+    yield ''
+
+def benchmark(cards=200, length=500, seed=1):
+    rng = random.Random(seed)
+    vocabulary = [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 10))) for _ in range(400)]
+    cases = []
+    for _ in range(cards):
+        correct = ''
+        while len(correct) < length:
+            correct += rng.choice(vocabulary) + ' '
+        correct = correct[:length].strip()
+        cases.extend((answer, correct) for answer in sample_answers(correct, rng))
+    start = time.perf_counter()
+    expected = [reference_grade(answer, correct) for answer, correct in cases]
+    reference_time = time.perf_counter() - start
+    prepared_matcher.cache_clear()
+    start = time.perf_counter()
+    actual = [grade_answer(answer, correct).verdict for answer, correct in cases]
+    grading_time = time.perf_counter() - start
+    mismatches = sum(1 for a, b in zip(expected, actual) if a != b)
+    return {
+        'answers': len(cases),
+        'sequence_matcher_seconds': round(reference_time, 4),
+        'grading_seconds': round(grading_time, 4),
+        'speedup': round(reference_time / grading_time, 2) if grading_time else None,
+        'mismatches': mismatches,
+    }
+
+if __name__ == '__main__':
+    result = benchmark()
+    for key, value in result.items():
+        print(f'{key}: {value}')
+    if result['mismatches']:
+        raise SystemExit('grade_answer disagrees with SequenceMatcher')
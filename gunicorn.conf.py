@@ -0,0 +1,24 @@
+import multiprocessing
+import os
+
+# gunicorn -c gunicorn.conf.py
+wsgi_app = 'app:create_app()'
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))  # keep at or below DB_POOL_SIZE + DB_MAX_OVERFLOW
+timeout = 30
+keepalive = 5
+max_requests = 2000
+max_requests_jitter = 200
+accesslog = os.environ.get('ACCESS_LOG', '-')
+
+# Create tables and search indexes once in the master instead of racing in every worker.
+# Study sessions must use the sqlite or redis store so all workers see them.
+preload_app = True
+
+def post_fork(server, worker):
+    # Connections opened by the master must not be shared with the forked workers.
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)
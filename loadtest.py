@@ -0,0 +1,137 @@
+import argparse
+import multiprocessing
+import os
+import random
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+PASSWORD = 'loadtest-password'
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def seed(users, cards):
+    from werkzeug.security import generate_password_hash
+    from app import app, db, User, FlashcardSet, Flashcard, init_database
+    password = generate_password_hash(PASSWORD)
+    accounts = []
+    with app.app_context():
+        init_database()
+        for i in range(users):
+            user = User(username=f'loadtest{i}', password=password)
+            db.session.add(user)
+            db.session.flush()
+            flashcard_set = FlashcardSet(title=f'Load test set {i}', user_id=user.id)
+            db.session.add(flashcard_set)
+            db.session.flush()
+            db.session.bulk_insert_mappings(Flashcard, [
+                {'term': f'term {n}', 'definition': f'definition number {n} of set {i}', 'set_id': flashcard_set.id, 'tags': ''}
+                for n in range(cards)
+            ])
+            accounts.append((user.username, flashcard_set.id))
+        db.session.commit()
+    return accounts
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(workers, port, env):
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+         '--workers', str(workers), '--bind', f'127.0.0.1:{port}', '--access-logfile', os.devnull, '--log-level', 'warning'],
+        cwd=HERE, env=env
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with code {server.returncode}')
+        try:
+            requests.get(f'http://127.0.0.1:{port}/', timeout=1)
+            return server
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError('gunicorn did not start')
+
+def run_client(job):
+    base_url, username, set_id, flow, duration = job
+    client = requests.Session()
+    client.post(f'{base_url}/login', data={'username': username, 'password': PASSWORD})
+    latencies = []
+    errors = 0
+
+    def timed(method, url, **kwargs):
+        nonlocal errors
+        started = time.perf_counter()
+        response = client.request(method, url, allow_redirects=False, **kwargs)
+        latencies.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            errors += 1
+
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        if flow == 'dashboard':
+            timed('GET', f'{base_url}/dashboard')
+        else:
+            url = f'{base_url}/practise/{set_id}?mode=classic'
+            timed('GET', url)
+            timed('POST', url, data={'user_answer': f'definition number {random.randrange(50)}'})
+    return latencies, errors
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0
+
+def measure(base_url, accounts, flow, clients, duration):
+    jobs = [(base_url, *accounts[i % len(accounts)], flow, duration) for i in range(clients)]
+    started = time.perf_counter()
+    with multiprocessing.Pool(clients) as pool:
+        results = pool.map(run_client, jobs)
+    elapsed = time.perf_counter() - started
+    latencies = sorted(latency for client_latencies, _ in results for latency in client_latencies)
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors for _, errors in results),
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Requests per second for the dashboard and practise flows under gunicorn.')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--clients', type=int, default=32, help='concurrent client processes')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per flow')
+    parser.add_argument('--users', type=int, default=32)
+    parser.add_argument('--cards', type=int, default=50)
+    parser.add_argument('--database-url', help='defaults to a new SQLite file in a temporary directory')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='studyace-load-')
+    env = dict(os.environ)
+    env['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(workdir, 'load.db')}"
+    env['STUDY_SESSION_PATH'] = os.path.join(workdir, 'study_sessions.db')
+    env.setdefault('SECRET_KEY', secrets.token_hex())  # create_app() refuses to start without one
+    os.environ.update(env)
+    accounts = seed(args.users, args.cards)
+
+    print(f"{'workers':>7} {'flow':>9} {'requests':>9} {'req/s':>8} {'p50 ms':>7} {'p95 ms':>7} {'errors':>6}")
+    for workers in args.workers:
+        port = free_port()
+        server = start_server(workers, port, env)
+        try:
+            for flow in ('dashboard', 'practise'):
+                result = measure(f'http://127.0.0.1:{port}', accounts, flow, args.clients, args.duration)
+                print(f"{workers:>7} {flow:>9} {result['requests']:>9} {result['rps']:>8.1f} "
+                      f"{result['p50_ms']:>7.1f} {result['p95_ms']:>7.1f} {result['errors']:>6}")
+        finally:
+            server.terminate()
+            server.wait()
+
+if __name__ == '__main__':
+    main()
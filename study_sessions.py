@@ -0,0 +1,124 @@
+import json
+import secrets
+import sqlite3
+import threading
+import time
+
+PURGE_EVERY = 100  # writes between sweeps of expired sessions
+
+def new_session_id():
+    return secrets.token_urlsafe(12)
+
+class MemoryStudySessionStore:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._data = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def get(self, sid):
+        with self._lock:
+            item = self._data.get(sid)
+            if item is None:
+                return None
+            if item[0] < time.time():
+                del self._data[sid]
+                return None
+            return json.loads(item[1])
+
+    def set(self, sid, state):
+        with self._lock:
+            self._data[sid] = (time.time() + self.ttl, json.dumps(state))
+            self._writes += 1
+            if self._writes % PURGE_EVERY == 0:
+                self._purge_locked()
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+
+    def purge_expired(self):
+        with self._lock:
+            self._purge_locked()
+
+    def _purge_locked(self):
+        now = time.time()
+        for sid in [sid for sid, (expires_at, _) in self._data.items() if expires_at < now]:
+            del self._data[sid]
+
+class SqliteStudySessionStore:
+    # Kept in its own database file so study steps never wait on the main database's write lock.
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS study_session ("
+                "id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_study_session_expires_at ON study_session (expires_at)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, sid):
+        row = self._connect().execute(
+            "SELECT data FROM study_session WHERE id = ? AND expires_at >= ?", (sid, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, sid, state):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO study_session (id, data, expires_at) VALUES (?, ?, ?)",
+                (sid, json.dumps(state, separators=(',', ':')), time.time() + self.ttl)
+            )
+        self._writes += 1
+        if self._writes % PURGE_EVERY == 0:
+            self.purge_expired()
+
+    def delete(self, sid):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM study_session WHERE id = ?", (sid,))
+
+    def purge_expired(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM study_session WHERE expires_at < ?", (time.time(),))
+
+class RedisStudySessionStore:
+    # Works with any client exposing get/setex/delete (redis-py, valkey, fakeredis, ...).
+    def __init__(self, client, ttl, prefix='study:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, sid):
+        data = self.client.get(self.prefix + sid)
+        return json.loads(data) if data else None
+
+    def set(self, sid, state):
+        self.client.setex(self.prefix + sid, self.ttl, json.dumps(state, separators=(',', ':')))
+
+    def delete(self, sid):
+        self.client.delete(self.prefix + sid)
+
+    def purge_expired(self):
+        pass  # Redis expires keys itself
+
+def create_study_store(kind, ttl, path=None, redis_url=None):
+    if kind == 'memory':
+        return MemoryStudySessionStore(ttl)
+    if kind == 'redis':
+        import redis  # only needed for this backend
+        return RedisStudySessionStore(redis.Redis.from_url(redis_url), ttl)
+    if kind == 'sqlite':
+        return SqliteStudySessionStore(path, ttl)
+    raise ValueError(f'Unknown study session store: {kind}')
@@ -0,0 +1,36 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The modules live at the top of the repository, next to app.py
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# app reads its settings at import time, so point it at a throwaway database before any test imports it
+DATA_DIR = tempfile.mkdtemp(prefix='studyace-test-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(DATA_DIR, 'test.db')
+os.environ['STUDY_SESSION_PATH'] = os.path.join(DATA_DIR, 'study_sessions.db')
+os.environ['SECRET_KEY'] = 'test'
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app, init_database
+    app.config['TESTING'] = True
+    if not os.path.isdir(os.path.join(app.root_path, app.template_folder)):
+        app.template_folder = app.root_path  # the templates sit next to app.py in this checkout
+    with app.app_context():
+        init_database()
+    return app
+
+@pytest.fixture
+def login(app):
+    # Signs up username (once) and returns a test client logged in as them.
+    def login(username, password='password'):
+        client = app.test_client()
+        client.post('/signup', data={'username': username, 'password': password})
+        response = client.post('/login', data={'username': username, 'password': password})
+        assert response.status_code == 302, response.get_data(as_text=True)
+        return client
+    return login
@@ -0,0 +1,34 @@
+import io
+import json
+
+import pytest
+
+from app import FlashcardSet
+
+def post_import(client, title, format, content):
+    return client.post('/import_set', data={
+        'title': title, 'format': format, 'file': (io.BytesIO(content.encode('utf-8')), f'cards.{format}')
+    }, content_type='multipart/form-data')
+
+def test_import_json(app, login):
+    client = login('importer')
+    cards = [{'term': f'term{i}', 'definition': f'definition {i}'} for i in range(5)]
+    response = post_import(client, 'Imported JSON', 'json', json.dumps({'title': 'x', 'cards': cards}))
+    assert response.status_code == 302 and response.location.endswith('/dashboard')
+    with app.app_context():
+        assert len(FlashcardSet.query.filter_by(title='Imported JSON').one().cards) == 5
+
+@pytest.mark.parametrize('format, content', [
+    ('json', json.dumps({'cards': [{'term': 'ok', 'definition': 'fine'}, {'term': None, 'definition': 'no term'}]})),
+    ('json', json.dumps({'cards': [{'term': 'number', 'definition': 42}]})),
+    ('csv', 'Term,Definition\r\nok,fine\r\nmissing\r\n'),
+    ('csv', 'Term,Definition\r\nblank,\r\n'),
+])
+def test_malformed_import_rolls_back(app, login, format, content):
+    client = login('importer')
+    response = post_import(client, f'Malformed {format}', format, content)
+    assert response.status_code == 302 and response.location.endswith('/import_set')
+    with client.session_transaction() as session:
+        assert any('needs a non-empty term and definition' in message for _, message in session['_flashes'])
+    with app.app_context():
+        assert FlashcardSet.query.filter_by(title=f'Malformed {format}').count() == 0
@@ -0,0 +1,81 @@
+import datetime
+import threading
+
+import pytest
+
+from app import db, User, UserBadge, award_badges, award_points, advance_daily_challenge
+
+THREADS = 8
+AWARDS = 25
+
+@pytest.fixture(scope='module')
+def user_id(app):
+    with app.app_context():
+        user = User(username='stress', password='x', streak=0, points=0,
+                    daily_challenge_date=str(datetime.date.today()), daily_challenge_progress=0)
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+def run_concurrently(worker):
+    errors = []
+
+    def guarded():
+        try:
+            worker()
+        except Exception as e:
+            errors.append(e)
+    pool = [threading.Thread(target=guarded) for _ in range(THREADS)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    assert errors == []
+
+def test_concurrent_awards_are_not_lost(app, user_id):
+    with app.app_context():
+        before = db.session.get(User, user_id).points
+
+    def worker():
+        for _ in range(AWARDS):
+            with app.app_context():
+                award_points(db.session.get(User, user_id), 1)
+                db.session.commit()
+    run_concurrently(worker)
+
+    with app.app_context():
+        assert db.session.get(User, user_id).points == before + THREADS * AWARDS
+
+def test_daily_challenge_bonus_paid_once(app, user_id):
+    with app.app_context():
+        before = db.session.get(User, user_id).points
+    bonuses = []
+
+    def worker():
+        for _ in range(AWARDS):
+            with app.app_context():
+                bonuses.append(advance_daily_challenge(db.session.get(User, user_id), 1))
+                db.session.commit()
+    run_concurrently(worker)
+
+    paid = [bonus for bonus in bonuses if bonus]
+    assert len(paid) == 1
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        assert user.daily_challenge_completed
+        assert user.daily_challenge_progress == 10
+        assert user.points == before + paid[0]
+        assert UserBadge.query.filter_by(user_id=user_id, name='Daily Challenge Winner').count() == 1
+
+def test_account_lists_user_badges(app, login):
+    client = login('badger')
+    with app.app_context():
+        user = User.query.filter_by(username='badger').one()
+        award_badges(user.id, ['100 points'])
+        db.session.commit()
+    client.post('/create_set', data={'title': 'Badge set', 'term': ['a', 'b'], 'definition': ['c', 'd']})
+    page = client.get('/account').get_data(as_text=True)
+    assert '100 points' in page
+    assert 'Created your first set' in page
+    with app.app_context():
+        assert User.query.filter_by(username='badger').one().badges == ''  # achievements stay out of the old column
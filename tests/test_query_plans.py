@@ -0,0 +1,26 @@
+import pytest
+from sqlalchemy import text
+
+from app import db, check_schema, full_scans, hot_queries
+
+def test_schema_and_hot_query_plans(app):
+    with app.app_context():
+        assert check_schema() == []
+
+@pytest.mark.parametrize('name', list(hot_queries()))
+def test_hot_query_uses_an_index(app, name):
+    with app.app_context():
+        assert full_scans(hot_queries()[name]) == []
+
+def test_missing_index_is_reported(app):
+    with app.app_context():
+        db.session.execute(text('DROP INDEX ix_flashcard_set_user_id'))
+        db.session.commit()
+        try:
+            problems = check_schema()
+            scans = full_scans(hot_queries()['dashboard sets'])
+        finally:
+            db.session.execute(text('CREATE INDEX IF NOT EXISTS ix_flashcard_set_user_id ON flashcard_set (user_id)'))
+            db.session.commit()
+    assert 'missing index ix_flashcard_set_user_id on flashcard_set' in problems
+    assert scans  # the dashboard query falls back to scanning flashcard_set
@@ -0,0 +1,31 @@
+import datetime
+import io
+import time
+
+from app import db, ReviewEvent, ReviewEventWriter, User, FlashcardSet
+
+def test_idle_buffer_is_flushed_on_a_timer(app):
+    writer = ReviewEventWriter(batch_size=100, flush_interval=0.2)
+    with app.app_context():
+        writer.add({'user_id': 999, 'card_id': 1, 'mode': 'game', 'verdict': 'correct', 'similarity': 1.0,
+                    'latency_ms': None, 'created_at': datetime.datetime.utcnow()})
+        deadline = time.monotonic() + 5
+        while writer.pending(999) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert writer.pending(999) == []
+        assert ReviewEvent.query.filter_by(user_id=999).count() == 1
+
+def test_bulk_grading_logs_review_events(app, login):
+    client = login('teacher')
+    with app.app_context():
+        user = User.query.filter_by(username='teacher').one()
+        cards = FlashcardSet.query.filter_by(user_id=user.id).first().cards
+        rows = ['user,card_id,answer'] + [f'teacher,{card.id},"{card.definition}"' for card in cards] + [f'teacher,{cards[0].id},zzz']
+    response = client.post('/bulk_grade', data={'file': (io.BytesIO('\n'.join(rows).encode()), 'answers.csv')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    with app.app_context():
+        events = ReviewEvent.query.filter_by(user_id=user.id, mode='bulk').all()
+        assert len(events) == len(cards) + 1
+        assert sorted(event.verdict for event in events).count('correct') == len(cards)
+        assert [event.similarity for event in events if event.verdict == 'incorrect'] == [None]
@@ -0,0 +1,84 @@
+import re
+
+import pytest
+
+from app import FlashcardSet
+
+# Every request below runs under app.testing, where a route over its query budget raises AssertionError.
+TERM_PATTERN = re.compile(r'<strong>Term:</strong>\s*(.*?)\s*<')
+CARDS = [(f'term{i}', f'definition number {i} for the smoke test') for i in range(12)]
+ADDED = ('added', 'a card added by the edit')
+
+def ok(response, status=200):
+    assert response.status_code == status, response.get_data(as_text=True)[:500]
+    return response
+
+@pytest.fixture(scope='module')
+def client(app):
+    client = app.test_client()
+    ok(client.get('/'))
+    ok(client.get('/signup'))
+    ok(client.post('/signup', data={'username': 'smoke', 'password': 'password'}), 302)
+    ok(client.get('/login'))
+    ok(client.post('/login', data={'username': 'smoke', 'password': 'password'}), 302)
+    return client
+
+@pytest.fixture(scope='module')
+def set_id(app, client):
+    ok(client.get('/create_set'))
+    ok(client.post('/create_set', data={
+        'title': 'Smoke set', 'term': [term for term, _ in CARDS], 'definition': [definition for _, definition in CARDS]
+    }), 302)
+    with app.app_context():
+        return FlashcardSet.query.filter_by(title='Smoke set').one().id
+
+@pytest.mark.parametrize('url', ['/dashboard', '/leaderboard', '/account', '/review_tag', '/review_tag?tag=smoke',
+                                 '/search_sets?query=smoke', '/export_all/json', '/import_set', '/bulk_grade'])
+def test_page(client, url):
+    ok(client.get(url))
+
+@pytest.mark.parametrize('url', ['/review/{id}', '/edit_set/{id}', '/practise/{id}', '/search_within_set/{id}?query=term1',
+                                 '/review_by_tag/{id}', '/export_set/{id}/json', '/export_set/{id}/csv'])
+def test_set_page(client, set_id, url):
+    ok(client.get(url.format(id=set_id)))
+
+def test_dashboard_search(client):
+    ok(client.post('/dashboard', data={'search_query': 'smoke'}))
+
+def test_edit_set(client, set_id):
+    page = ok(client.get(f'/edit_set/{set_id}')).get_data(as_text=True)
+    card_ids = re.findall(r'name="card_id" value="(\d+)"', page)
+    assert len(card_ids) == len(CARDS)
+    ok(client.post(f'/edit_set/{set_id}', data={
+        'title': 'Smoke set', 'card_id': card_ids + [''], 'term': [term for term, _ in CARDS + [ADDED]],
+        'definition': [definition for _, definition in CARDS + [ADDED]], 'tags': ['smoke'] * (len(CARDS) + 1)
+    }), 302)
+
+def play(client, url, answer):
+    # Answers every card of a session, then loads the result page; returns the number answered.
+    definitions = dict(CARDS + [ADDED])
+    for answered in range(len(definitions) + 1):
+        page = ok(client.get(url)).get_data(as_text=True)
+        match = TERM_PATTERN.search(page)
+        if not match:
+            return answered
+        ok(client.post(url, data=answer(definitions[match.group(1)])), 302)
+    raise AssertionError(f'{url} did not finish')
+
+@pytest.mark.parametrize('url, answer', [
+    ('/practise/{id}?mode=classic', lambda correct: {'user_answer': correct}),
+    ('/practise/{id}?mode=due', lambda correct: {'user_answer': correct}),
+    ('/practise/{id}?mode=multiple_choice', lambda correct: {'choice': correct}),
+    ('/practise/{id}?mode=fill_blank', lambda correct: {'user_answer': correct.split()[0]}),
+])
+def test_practise_mode(client, set_id, url, answer):
+    assert play(client, url.format(id=set_id), answer) > 0
+
+def test_delete_set_and_logout(app, client):
+    ok(client.post('/create_set', data={'title': 'Doomed set', 'term': ['a', 'b'], 'definition': ['c', 'd']}), 302)
+    with app.app_context():
+        doomed = FlashcardSet.query.filter_by(title='Doomed set').one().id
+    ok(client.post(f'/delete_set/{doomed}'), 302)
+    with app.app_context():
+        assert FlashcardSet.query.filter_by(title='Doomed set').count() == 0
+    ok(client.get('/logout'), 302)
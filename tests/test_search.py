@@ -0,0 +1,42 @@
+import pytest
+
+from app import db, User, FlashcardSet, Flashcard, search_backend, search_sets_for_user, search_cards_in_set
+
+@pytest.fixture(scope='module')
+def owners(app):
+    with app.app_context():
+        sets = {}
+        for username, titles in (('searcher', ['Enzyme basics', 'Cell biology']), ('other', ['Enzyme kinetics'])):
+            user = User(username=username, password='x')
+            db.session.add(user)
+            db.session.flush()
+            for title in titles:
+                flashcard_set = FlashcardSet(title=title, user_id=user.id)
+                db.session.add(flashcard_set)
+                db.session.flush()
+                sets[title] = flashcard_set.id
+                db.session.add_all([
+                    Flashcard(term='Catalyst', definition='An enzyme speeds up a reaction', set_id=flashcard_set.id, tags=''),
+                    Flashcard(term='Membrane', definition='Surrounds the cell', set_id=flashcard_set.id, tags=''),
+                ])
+            sets[username] = user.id
+        db.session.commit()
+        return sets
+
+def test_search_uses_full_text_index(app):
+    with app.app_context():
+        assert search_backend() == 'fts5'
+
+def test_set_search_only_returns_own_sets(app, owners):
+    with app.app_context():
+        results, more = search_sets_for_user(owners['searcher'], 'enzy')
+    # Title matches rank ahead of sets that only match through their cards
+    assert [s.id for s in results] == [owners['Enzyme basics'], owners['Cell biology']]
+    assert not more
+
+def test_card_search_stays_in_set(app, owners):
+    with app.app_context():
+        results, _ = search_cards_in_set(owners['Cell biology'], 'enzyme')
+        assert [card.set_id for card in results] == [owners['Cell biology']]
+        # A number in the query must not match the indexed set_id column
+        assert search_cards_in_set(owners['Cell biology'], str(owners['Cell biology'])) == ([], False)
@@ -0,0 +1,79 @@
+import os
+import signal
+import subprocess
+import sys
+
+import pytest
+
+from user_store import UserStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Saves one user with a long flush delay, so the save is still pending when the process is stopped
+CHILD_SAVE = '''
+import os, sys, time
+sys.path.insert(0, sys.argv[1])
+os.chdir(sys.argv[2])
+import flashcards
+flashcards.flush_on_signals()
+flashcards.SAVE_FLUSH_DELAY = 3600
+flashcards.save_user_data({'erin': {'version': 1}}, 'erin')
+print('saved', flush=True)
+if sys.argv[3] == 'interrupt':
+    raise KeyboardInterrupt
+time.sleep(60)
+'''
+
+def test_failed_rename_keeps_old_file(tmp_path, monkeypatch):
+    store = UserStore(tmp_path)
+    store.save('alice', {'version': 1})
+
+    def crash(*args):
+        raise OSError('simulated crash before rename')
+    with monkeypatch.context() as patch:
+        patch.setattr(os, 'replace', crash)
+        with pytest.raises(OSError):
+            store.save('alice', {'version': 2})
+
+    assert UserStore(tmp_path).read('alice') == {'version': 1}
+    assert not [name for name in os.listdir(store.users_path) if name.endswith('.tmp')]
+
+def test_stale_temp_file_removed(tmp_path):
+    store = UserStore(tmp_path)
+    store.save('alice', {'version': 1})
+    stale = store.shard_path('alice') + '.999.tmp'
+    with open(stale, 'wb') as f:
+        f.write(b'half a file')  # what a killed process leaves behind
+
+    store = UserStore(tmp_path)
+    assert not os.path.exists(stale)
+    assert store.read('alice') == {'version': 1}
+
+def test_torn_index_line_ignored(tmp_path):
+    store = UserStore(tmp_path)
+    store.save('alice', {'version': 1})
+    store.save('bob', {'version': 1})
+    with open(store.index_path, 'ab') as f:
+        f.write(b'{"user":"car')  # an index append cut short
+
+    store = UserStore(tmp_path)
+    assert store.usernames() == ['alice', 'bob']
+    store.save('dave', {'version': 1})
+    assert UserStore(tmp_path).usernames() == ['alice', 'bob', 'dave']
+    assert UserStore(tmp_path).read('dave') == {'version': 1}
+
+@pytest.mark.parametrize('how', ['interrupt', 'terminate'])
+def test_pending_save_flushed_on_exit(tmp_path, how):
+    if how == 'terminate' and not hasattr(signal, 'SIGTERM'):
+        pytest.skip('no SIGTERM on this platform')
+    child = subprocess.Popen([sys.executable, '-c', CHILD_SAVE, ROOT, str(tmp_path), how],
+                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    assert child.stdout.readline().strip() == 'saved'
+    if how == 'terminate':
+        child.terminate()
+    child.wait(timeout=30)
+    child.stdout.close()
+
+    store = UserStore(tmp_path / 'user_data')
+    assert store.usernames() == ['erin']
+    assert store.read('erin') == {'version': 1}
@@ -0,0 +1,317 @@
+import contextlib
+import gzip
+import hashlib
+import json
+import lzma
+import marshal
+import os
+import pickle
+import time
+import zlib
+from collections.abc import MutableMapping
+
+INDEX_FILE = 'index.log'
+COMPACT_MIN_LINES = 1000  # rewrite the index once it has this many lines and most of them are stale
+
+# User files start with MAGIC, the header version, then one byte each for the format, the format's own
+# version and the compression. Files without the header are the gzip JSON written before formats existed.
+MAGIC = b'SAU'
+HEADER_VERSION = 1
+GZIP_MAGIC = b'\x1f\x8b'
+
+# name: (id, version, dumps, loads). marshal and pickle files must only be read from a trusted directory.
+FORMATS = {
+    'json': (1, 1, lambda record: json.dumps(record, separators=(',', ':')).encode('utf-8'), json.loads),
+    'marshal': (2, marshal.version, marshal.dumps, marshal.loads),
+    'pickle': (3, 5, lambda record: pickle.dumps(record, protocol=5), pickle.loads),
+}
+
+# name: (id, compress(data, level), decompress, default level)
+COMPRESSIONS = {
+    'none': (0, lambda data, level: data, lambda data: data, None),
+    'gzip': (1, lambda data, level: gzip.compress(data, compresslevel=level), gzip.decompress, 6),
+    'zlib': (2, lambda data, level: zlib.compress(data, level), zlib.decompress, 1),
+    'lzma': (3, lambda data, level: lzma.compress(data, preset=level), lzma.decompress, 1),
+}
+
+FORMATS_BY_ID = {spec[0]: spec for spec in FORMATS.values()}
+COMPRESSIONS_BY_ID = {spec[0]: spec for spec in COMPRESSIONS.values()}
+HEADER_SIZE = len(MAGIC) + 4
+
+class Serializer:
+    # Encodes user files in the chosen format and compression; decodes any of them, whatever is configured.
+    def __init__(self, format='marshal', compression='zlib', level=None):
+        if format not in FORMATS:
+            raise ValueError(f'Unknown user data format: {format}')
+        if compression not in COMPRESSIONS:
+            raise ValueError(f'Unknown user data compression: {compression}')
+        self.format = format
+        self.compression = compression
+        self.level = COMPRESSIONS[compression][3] if level is None else level
+
+    def dumps(self, record):
+        format_id, format_version, dumps, _ = FORMATS[self.format]
+        compression_id, compress, _, _ = COMPRESSIONS[self.compression]
+        header = MAGIC + bytes((HEADER_VERSION, format_id, format_version, compression_id))
+        return header + compress(dumps(record), self.level)
+
+    @staticmethod
+    def loads(data):
+        if data.startswith(GZIP_MAGIC):
+            return json.loads(gzip.decompress(data))
+        if not data.startswith(MAGIC) or len(data) < HEADER_SIZE:
+            raise ValueError('Not a user data file')
+        header_version, format_id, format_version, compression_id = data[len(MAGIC):HEADER_SIZE]
+        if header_version > HEADER_VERSION:
+            raise ValueError(f'User data file header version {header_version} is newer than this program')
+        format_spec = FORMATS_BY_ID.get(format_id)
+        if format_spec is None or format_version > format_spec[1]:
+            raise ValueError(f'Unsupported user data format {format_id} version {format_version}')
+        compression_spec = COMPRESSIONS_BY_ID.get(compression_id)
+        if compression_spec is None:
+            raise ValueError(f'Unsupported user data compression {compression_id}')
+        return format_spec[3](compression_spec[2](data[HEADER_SIZE:]))
+
+def fsync_dir(path):
+    # Makes a rename durable; directories cannot be opened this way on Windows.
+    if os.name == 'nt':
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def atomic_write(path, data):
+    # Write a temporary file next to the target, fsync it and rename it over the target,
+    # so a crash leaves either the old file or the new one, never a partial one.
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+    fsync_dir(os.path.dirname(path) or '.')
+
+def encode_entry(entry):
+    return (json.dumps(entry, separators=(',', ':')) + '\n').encode('utf-8')
+
+class UserStore:
+    # One file per user (encoded by serializer) plus an append-only index of usernames, so saving a user
+    # rewrites only that user's file and appends one index line.
+    # save() only marks a user dirty; dirty users are written together when the oldest change
+    # is flush_delay seconds old at the next save, or when flush() is called.
+    # summarize(record) returns a small dict kept in the user's index line (e.g. leaderboard
+    # counters), so summaries() can be read without decoding any user file.
+    def __init__(self, path, flush_delay=0, summarize=None, serializer=None):
+        self.path = os.path.abspath(path)
+        self.serializer = serializer or Serializer()
+        self.users_path = os.path.join(self.path, 'users')
+        self.index_path = os.path.join(self.path, INDEX_FILE)
+        self.flush_delay = flush_delay
+        self.summarize = summarize
+        os.makedirs(self.users_path, exist_ok=True)
+        self._index = {}
+        self._index_lines = 0
+        self._pending = {}
+        self._pending_since = None
+        self._load_index()
+        if summarize and any(len(entry) == 1 for entry in self._index.values()):
+            # Index written before summaries existed: fill them in once.
+            for username, entry in self._index.items():
+                if len(entry) == 1:
+                    self._index[username] = self.summary_entry(username, self.read(username))
+            self.compact()
+        for name in os.listdir(self.users_path):
+            if name.endswith('.tmp'):  # left behind by a crash before its rename
+                os.remove(os.path.join(self.users_path, name))
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, 'rb') as f:
+            data = f.read()
+        valid = data.rfind(b'\n') + 1  # anything after the last newline is an append torn by a crash
+        try:
+            entries = json.loads(b'[' + b','.join(data[:valid].splitlines()) + b']')  # one parse, not one per line
+        except ValueError:
+            entries = []
+            for line in data[:valid].splitlines():
+                with contextlib.suppress(ValueError):  # skip a damaged line, keep the rest
+                    entries.append(json.loads(line))
+        for entry in entries:
+            if entry.get('deleted'):
+                self._index.pop(entry['user'], None)
+            else:
+                self._index[entry['user']] = entry
+        self._index_lines = len(entries)
+        if valid < len(data):
+            with open(self.index_path, 'r+b') as f:
+                f.truncate(valid)
+                os.fsync(f.fileno())
+
+    def shard_path(self, username):
+        name = hashlib.sha1(username.encode('utf-8')).hexdigest()
+        return os.path.join(self.users_path, name + '.user')
+
+    def __contains__(self, username):
+        if username in self._pending:
+            return self._pending[username] is not None
+        return username in self._index
+
+    def __len__(self):
+        return len(self.usernames())
+
+    def usernames(self):
+        names = [name for name in self._index if self._pending.get(name, True) is not None]
+        names += [name for name, record in self._pending.items() if record is not None and name not in self._index]
+        return names
+
+    def read(self, username):
+        if username in self._pending:
+            if self._pending[username] is None:
+                raise KeyError(username)
+            return self._pending[username]
+        if username not in self._index:
+            raise KeyError(username)
+        with open(self.shard_path(username), 'rb') as f:
+            return self.serializer.loads(f.read())
+
+    def save(self, username, record):
+        # record is serialized when it is flushed, so later changes to it are saved too.
+        self._pending[username] = record
+        now = time.monotonic()
+        if self._pending_since is None:
+            self._pending_since = now
+        if now - self._pending_since >= self.flush_delay:
+            self.flush()
+
+    def flush(self):
+        for username, record in list(self._pending.items()):
+            self.write(username, record)
+            del self._pending[username]
+        self._pending_since = None
+
+    def write(self, username, record):
+        if record is None:
+            return self.delete(username)
+        self._write_shard(username, record)
+        entry = self.summary_entry(username, record)
+        if self._index.get(username) != entry:
+            self._append_index(entry)
+
+    def summary_entry(self, username, record):
+        return {'user': username, **self.summarize(record)} if self.summarize else {'user': username}
+
+    def summaries(self):
+        # Index entries of every user, with unflushed saves taken into account.
+        for username, entry in self._index.items():
+            if username not in self._pending:
+                yield entry
+        for username, record in self._pending.items():
+            if record is not None:
+                yield self.summary_entry(username, record)
+
+    def _write_shard(self, username, record):
+        atomic_write(self.shard_path(username), self.serializer.dumps(record))
+
+    def delete(self, username):
+        if username not in self._index:
+            return
+        self._append_index({'user': username, 'deleted': True})
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.shard_path(username))
+
+    def write_many(self, records):
+        # Bulk load (e.g. migrating the old single file): one index rewrite instead of a line per user.
+        for username, record in records.items():
+            self._write_shard(username, record)
+            self._index[username] = self.summary_entry(username, record)
+        self.compact()
+
+    def _append_index(self, entry):
+        with open(self.index_path, 'ab') as f:
+            f.write(encode_entry(entry))
+            f.flush()
+            os.fsync(f.fileno())
+        self._index_lines += 1
+        if entry.get('deleted'):
+            self._index.pop(entry['user'], None)
+        else:
+            self._index[entry['user']] = entry
+        if self._index_lines >= COMPACT_MIN_LINES and self._index_lines > 2 * len(self._index):
+            self.compact()
+
+    def compact(self):
+        atomic_write(self.index_path, b''.join(encode_entry(entry) for entry in self._index.values()))
+        self._index_lines = len(self._index)
+
+    def import_legacy(self, legacy_path):
+        # One-time move from the old user_data.json.gz; the old file is kept with a .migrated suffix.
+        if not os.path.exists(legacy_path) or self._index:
+            return False
+        with gzip.open(legacy_path, 'rt', encoding='utf-8') as f:
+            self.write_many(json.load(f))
+        os.replace(legacy_path, legacy_path + '.migrated')
+        return True
+
+class LazyUserData(MutableMapping):
+    # Dict-like view of a UserStore that decodes a user's file the first time that user is looked up,
+    # so logging in reads the index and one file instead of every account.
+    def __init__(self, store):
+        self.store = store
+        self._loaded = {}
+        self._deleted = set()
+
+    def __getitem__(self, username):
+        if username in self._loaded:
+            return self._loaded[username]
+        if username in self._deleted:
+            raise KeyError(username)
+        record = self._loaded[username] = self.store.read(username)
+        return record
+
+    def __setitem__(self, username, record):
+        self._deleted.discard(username)
+        self._loaded[username] = record
+
+    def __delitem__(self, username):
+        if username not in self:
+            raise KeyError(username)
+        self._loaded.pop(username, None)
+        self._deleted.add(username)
+
+    def __contains__(self, username):
+        if username in self._loaded:
+            return True
+        return username not in self._deleted and username in self.store
+
+    def __iter__(self):
+        for username in self.store.usernames():
+            if username not in self._deleted:
+                yield username
+        for username in list(self._loaded):
+            if username not in self.store:
+                yield username
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def summaries(self):
+        # The store's summaries, with users changed through this view summarized from their current data.
+        rows = {entry['user']: entry for entry in self.store.summaries()}
+        for username in self.touched():
+            if username in self:
+                rows[username] = self.store.summary_entry(username, self[username])
+            else:
+                rows.pop(username, None)
+        return list(rows.values())
+
+    def touched(self):
+        # Users that were loaded, added or deleted through this view; only these can have changed.
+        return list(self._loaded) + list(self._deleted)